@@ -0,0 +1,34 @@
+"""create processed_updates table
+
+Revision ID: a93d5e07c214
+Revises: e8a35c7f1b90
+Create Date: 2026-10-17 20:02:13.518406
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a93d5e07c214'
+down_revision: Union[str, None] = 'e8a35c7f1b90'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('processed_updates',
+    sa.Column('update_id', sa.BigInteger(), autoincrement=False, nullable=False),
+    sa.Column('received_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('update_id')
+    )
+    op.create_index(op.f('ix_processed_updates_received_at'), 'processed_updates', ['received_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_processed_updates_received_at'), table_name='processed_updates')
+    op.drop_table('processed_updates')
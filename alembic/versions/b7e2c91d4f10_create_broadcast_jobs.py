@@ -0,0 +1,59 @@
+"""create broadcast jobs and deliveries
+
+Revision ID: b7e2c91d4f10
+Revises: 36ba4a34dbb5
+Create Date: 2026-10-17 10:12:31.418220
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7e2c91d4f10'
+down_revision: Union[str, None] = '36ba4a34dbb5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('broadcast_jobs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('admin_id', sa.BigInteger(), nullable=False),
+    sa.Column('type', sa.String(), nullable=False),
+    sa.Column('text', sa.Text(), nullable=True),
+    sa.Column('file_id', sa.String(), nullable=True),
+    sa.Column('caption', sa.Text(), nullable=True),
+    sa.Column('reply_markup', sa.JSON(), nullable=True),
+    sa.Column('status', sa.String(), server_default='pending', nullable=False),
+    sa.Column('cursor', sa.BigInteger(), nullable=True),
+    sa.Column('sent', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('failed', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('lease_owner', sa.String(), nullable=True),
+    sa.Column('lease_until', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_broadcast_jobs_id'), 'broadcast_jobs', ['id'], unique=False)
+    op.create_index(op.f('ix_broadcast_jobs_status'), 'broadcast_jobs', ['status'], unique=False)
+    op.create_table('broadcast_deliveries',
+    sa.Column('job_id', sa.Integer(), nullable=False),
+    sa.Column('chat_id', sa.BigInteger(), nullable=False),
+    sa.Column('status', sa.String(), server_default='claimed', nullable=False),
+    sa.Column('error', sa.String(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['job_id'], ['broadcast_jobs.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('job_id', 'chat_id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('broadcast_deliveries')
+    op.drop_index(op.f('ix_broadcast_jobs_status'), table_name='broadcast_jobs')
+    op.drop_index(op.f('ix_broadcast_jobs_id'), table_name='broadcast_jobs')
+    op.drop_table('broadcast_jobs')
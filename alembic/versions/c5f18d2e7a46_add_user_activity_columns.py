@@ -0,0 +1,41 @@
+"""add user activity columns and broadcast segments
+
+Revision ID: c5f18d2e7a46
+Revises: a93d5e07c214
+Create Date: 2026-10-17 21:14:38.207153
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5f18d2e7a46'
+down_revision: Union[str, None] = 'a93d5e07c214'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('users', sa.Column('last_seen', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('users', sa.Column('is_active', sa.Boolean(), server_default=sa.text('true'), nullable=False))
+    op.create_index(op.f('ix_users_lang'), 'users', ['lang'], unique=False)
+    op.create_index(op.f('ix_users_last_seen'), 'users', ['last_seen'], unique=False)
+    op.create_index(op.f('ix_users_is_active'), 'users', ['is_active'], unique=False)
+    op.create_index('ix_users_active_chat_id', 'users', ['chat_id'], unique=False,
+                    postgresql_where=sa.text('is_active'))
+    op.add_column('broadcast_jobs', sa.Column('segment', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('broadcast_jobs', 'segment')
+    op.drop_index('ix_users_active_chat_id', table_name='users', postgresql_where=sa.text('is_active'))
+    op.drop_index(op.f('ix_users_is_active'), table_name='users')
+    op.drop_index(op.f('ix_users_last_seen'), table_name='users')
+    op.drop_index(op.f('ix_users_lang'), table_name='users')
+    op.drop_column('users', 'is_active')
+    op.drop_column('users', 'last_seen')
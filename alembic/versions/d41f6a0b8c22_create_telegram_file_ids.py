@@ -0,0 +1,36 @@
+"""create telegram_file_ids table
+
+Revision ID: d41f6a0b8c22
+Revises: b7e2c91d4f10
+Create Date: 2026-10-17 11:40:05.902114
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd41f6a0b8c22'
+down_revision: Union[str, None] = 'b7e2c91d4f10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('telegram_file_ids',
+    sa.Column('url', sa.String(), nullable=False),
+    sa.Column('etag', sa.String(), nullable=False),
+    sa.Column('file_id', sa.String(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('url')
+    )
+    op.create_index(op.f('ix_telegram_file_ids_updated_at'), 'telegram_file_ids', ['updated_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_telegram_file_ids_updated_at'), table_name='telegram_file_ids')
+    op.drop_table('telegram_file_ids')
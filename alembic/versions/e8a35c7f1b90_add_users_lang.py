@@ -0,0 +1,28 @@
+"""add users.lang
+
+Revision ID: e8a35c7f1b90
+Revises: d41f6a0b8c22
+Create Date: 2026-10-17 13:05:47.221930
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e8a35c7f1b90'
+down_revision: Union[str, None] = 'd41f6a0b8c22'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('users', sa.Column('lang', sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('users', 'lang')
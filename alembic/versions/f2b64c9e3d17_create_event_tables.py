@@ -0,0 +1,51 @@
+"""create events and event_daily tables
+
+Revision ID: f2b64c9e3d17
+Revises: c5f18d2e7a46
+Create Date: 2026-10-17 22:41:09.634812
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2b64c9e3d17'
+down_revision: Union[str, None] = 'c5f18d2e7a46'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('events',
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('kind', sa.String(), nullable=False),
+    sa.Column('chat_id', sa.BigInteger(), nullable=True),
+    sa.Column('lang', sa.String(), nullable=True),
+    sa.Column('slot', sa.String(), nullable=True),
+    sa.Column('rank', sa.SmallInteger(), nullable=True),
+    sa.Column('value', sa.Float(), nullable=True),
+    postgresql_partition_by='RANGE (created_at)'
+    )
+    # daily partitions are created ahead by the app; this catches the rest
+    op.execute('CREATE TABLE events_default PARTITION OF events DEFAULT')
+    op.create_table('event_daily',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('kind', sa.String(), nullable=False),
+    sa.Column('lang', sa.String(), nullable=False),
+    sa.Column('slot', sa.String(), nullable=False),
+    sa.Column('events', sa.BigInteger(), nullable=False),
+    sa.Column('users', sa.BigInteger(), nullable=False),
+    sa.Column('value', sa.Float(), server_default='0', nullable=False),
+    sa.PrimaryKeyConstraint('day', 'kind', 'lang', 'slot')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('event_daily')
+    # drops every partition with it
+    op.drop_table('events')
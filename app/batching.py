@@ -0,0 +1,85 @@
+# app/batching.py
+import asyncio
+import logging
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def log_task_failure(task: asyncio.Task) -> None:
+    """Done-callback for fire-and-forget tasks; name them for a useful log line."""
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("%s failed", task.get_name(), exc_info=task.exception())
+
+
+class BatchWriter:
+    """
+    Write-behind buffer. Subclasses fill `_buffer` and implement `_write`;
+    `flush()` hands the whole buffer to `_write` under a lock and puts it
+    back if that raises. It runs every `flush_interval` seconds between
+    start() and stop(), once more on stop(), and early via flush_soon().
+    """
+
+    # re-raised by the flush loop instead of being logged, ending it
+    fatal: tuple = ()
+
+    def __init__(self, flush_interval: float):
+        self.flush_interval = flush_interval
+        self._buffer: list = []
+        self._lock = asyncio.Lock()
+        self._tasks: set[asyncio.Task] = set()
+        self._loop_task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._loop_task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self) -> None:
+        if self._loop_task is not None:
+            self._loop_task.cancel()
+            await asyncio.gather(self._loop_task, *self._tasks, return_exceptions=True)
+        await self.flush()
+
+    def flush_soon(self, delay: float = 0.0) -> None:
+        """Flushes in the background after `delay` seconds, unless a flush is already due."""
+        if self._tasks:
+            return
+        task = asyncio.create_task(self._flush_after(delay), name=f"{type(self).__name__} flush")
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        task.add_done_callback(log_task_failure)
+
+    async def _flush_after(self, delay: float) -> None:
+        await asyncio.sleep(delay)
+        await self.flush()
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except self.fatal:
+                raise
+            except Exception:
+                logger.exception("%s flush failed", type(self).__name__)
+
+    async def flush(self) -> None:
+        async with self._lock:
+            batch = self._take()
+            if not batch:
+                return
+            try:
+                await self._write(batch)
+            except Exception:
+                self._put_back(batch)
+                raise
+
+    def _take(self) -> Any:
+        batch, self._buffer = self._buffer, type(self._buffer)()
+        return batch
+
+    def _put_back(self, batch: Any) -> None:
+        # ahead of anything buffered since, for the next flush
+        self._buffer[:0] = batch
+
+    async def _write(self, batch: Any) -> None:
+        raise NotImplementedError
@@ -5,48 +5,85 @@ from telegram import (
     InlineKeyboardButton,
     InlineKeyboardMarkup,
 )
-from telegram.error import RetryAfter
-from telegram.ext import ApplicationBuilder, ContextTypes, CommandHandler, CallbackQueryHandler, MessageHandler, filters
-from app.database import database
+from telegram.constants import ChatType
+from telegram.error import BadRequest
+from telegram.ext import (
+    ApplicationBuilder,
+    ContextTypes,
+    CommandHandler,
+    CallbackQueryHandler,
+    MessageHandler,
+    TypeHandler,
+    filters,
+)
+from app.batching import log_task_failure
+from app.broadcast import (
+    BroadcastEngine,
+    BroadcastStats,
+    count_recipients,
+    describe_segment,
+    send_broadcast_message,
+)
+from app.broadcast_jobs import (
+    DeliveryLog,
+    acquire_job,
+    confirm_draft,
+    discard_draft,
+    finish_job,
+    get_draft,
+    job_progress,
+    job_to_bcast,
+    resumable_job_ids,
+    start_draft,
+    update_draft,
+)
+from app.events import engagement_report, events
+from app.file_ids import file_id_cache
 from app.languages import LANGUAGES
-from app.spaces_client import list_today_slots, load_play_url, load_slot_metadata
-from sqlalchemy.dialects.postgresql import insert
-from datetime import date
+from app.metrics import timed_handler
+from app.navigation import show_photo, show_text
+from app.persistence import UserStatePersistence
+from app.ranking import card_keyboard, get_ranking
+from app.registrar import registrar
+from app.transport import bulk_bot, get_updates_request, interactive_request
 from .config import settings
-from .models import User
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# In-memory cache for Telegram file_ids
-FILE_ID_CACHE: dict[str, str] = {}
-BROADCAST_STATE = {}
+DRAFT_EXPIRED = "This broadcast draft is no longer open: it expired or a newer /broadcast replaced it. Nothing was sent."
+
+
+def register_user(user_data):
+    # buffered; known users cost nothing, new ones are inserted in batches
+    registrar.register(user_data.id, user_data.username)
 
 
-async def register_user(user_data):
-    stmt = insert(User).values(
-        chat_id=user_data.id,
-        username=user_data.username
-    ).on_conflict_do_nothing(index_elements=['chat_id'])
-    await database.execute(stmt)
+async def track_activity(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # runs before every other handler; buffered like registration
+    chat = update.effective_chat
+    if chat is not None and chat.type == ChatType.PRIVATE:
+        registrar.touch(chat.id)
 
 
+def language_keyboard() -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton(f"{LANGUAGES[lang]['flag']} {lang}", callback_data=f"lang|{lang}")]
+        for lang in LANGUAGES
+    ])
+
+
+@timed_handler("start")
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
-    await register_user(user)
-    # Build language selection buttons
-    keyboard = [
-        [InlineKeyboardButton(f"{LANGUAGES[lang]['flag']} {lang}", callback_data=f"lang|{lang}")]
-        for lang in LANGUAGES.keys()
-    ]
+    register_user(user)
     text = LANGUAGES['AZ']['welcome'].format(first_name=user.first_name)
     await update.message.reply_markdown(
         text,
-        reply_markup=InlineKeyboardMarkup(keyboard)
+        reply_markup=language_keyboard()
     )
 
 
+@timed_handler("choose_language")
 async def choose_language(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
@@ -56,22 +93,11 @@ async def choose_language(update: Update, context: ContextTypes.DEFAULT_TYPE):
     context.user_data['lang'] = lang
     tpl = LANGUAGES[lang]
 
-    # 2) build your header
-    today = date.today().strftime("%d.%m.%Y")
-    header_text = tpl["top_slots"].format(today=today) + "\n\n" + tpl["description"]
+    # 2) today's prebuilt ranking (header + medalled keyboard)
+    ranking = await get_ranking(lang)
+    events.screen("open_menu", query.from_user.id, lang)
 
-    # 3) raw slots + metadata ordering
-    raw_slots = list_today_slots(lang)
-    metadata_map = load_slot_metadata(lang)
-
-    # preserve only those that exist in raw_slots, in metadata.json order:
-    ordered_slots = [
-        next((s for s in raw_slots if s["name"] == name), None)
-        for name in metadata_map.keys()
-    ]
-    slot_items = [s for s in ordered_slots if s]
-
-    if not slot_items:
+    if not ranking.names:
         try:
             await query.edit_message_text(tpl["no_slots"], parse_mode="Markdown")
         except Exception as e:
@@ -80,52 +106,20 @@ async def choose_language(update: Update, context: ContextTypes.DEFAULT_TYPE):
             else:
                 raise
 
-    medals = ["🥇", "🥈", "🥉"]
-    keyboard: list[list[InlineKeyboardButton]] = []
-
-    for idx, slot in enumerate(slot_items):
-        # pick a medal or fall back to “4.”, “5.”, etc.
-        prefix = medals[idx] if idx < 3 else f"{idx + 1}."
-        label = f"{prefix} {slot['name']}"
-        keyboard.append(
-            [InlineKeyboardButton(label, callback_data=f"slot|{slot['name']}")]
-        )
-
-    # finally add your “Back” button
-    keyboard.append([InlineKeyboardButton("⬅️ Back", callback_data="back_to_language")])
-
-    await query.edit_message_text(
-        text=header_text,
-        parse_mode="Markdown",
-        reply_markup=InlineKeyboardMarkup(keyboard),
-    )
+    await show_text(query, ranking.header, ranking.keyboard)
 
 
+@timed_handler("back_to_language")
 async def back_to_language(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
 
-    # 1) delete the photo (or whatever message) you’re standing on
-    try:
-        await query.message.delete()
-    except Exception:
-        pass
-
-    # 2) rebuild your language-picker menu exactly like in /start
-    user = update.effective_user
-    keyboard = [
-        [InlineKeyboardButton(f"{LANGUAGES[lang]['flag']} {lang}", callback_data=f"lang|{lang}")]
-        for lang in LANGUAGES
-    ]
-    text = LANGUAGES['AZ']['welcome'].format(first_name=user.first_name)
-
-    # 3) send a new text message with that keyboard
-    await query.message.reply_markdown(
-        text,
-        reply_markup=InlineKeyboardMarkup(keyboard)
-    )
+    # the language picker, exactly like in /start, in place of the current menu
+    text = LANGUAGES['AZ']['welcome'].format(first_name=update.effective_user.first_name)
+    await show_text(query, text, language_keyboard())
 
 
+@timed_handler("choose_slot")
 async def choose_slot(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
@@ -133,99 +127,63 @@ async def choose_slot(update: Update, context: ContextTypes.DEFAULT_TYPE):
     lang = context.user_data.get("lang", "AZ")
     tpl = LANGUAGES[lang]
 
-    # 1) re-load slots & metadata map
-    raw_slots = list_today_slots(lang)
-    metadata_map = load_slot_metadata(lang)
-
-    # 2) re-derive the same ordered list
-    ordered = [
-        next((s for s in raw_slots if s["name"] == name), None)
-        for name in metadata_map.keys()
-    ]
-    slots = [s for s in ordered if s]
-
-    # 3) pick the one the user tapped
+    # 1) pick the one the user tapped from today's ranking
+    ranking = await get_ranking(lang)
     slot_name = query.data.split("|", 1)[1]
-    slot = next((s for s in slots if s["name"] == slot_name), None)
+    slot = ranking.slots.get(slot_name)
     if not slot:
         return await query.message.reply_text(tpl["slot_not_found"], parse_mode="Markdown")
+    events.screen("open_slot", query.from_user.id, lang, slot_name, ranking.ranks[slot_name] + 1)
 
-    # 4) find its position & medal
-    pos = [s["name"] for s in slots].index(slot_name)
-    medals = ["🥇", "🥈", "🥉"]
-    prefix = medals[pos] if pos < 3 else f"{pos + 1}."
-
-    # 5) get its metadata fields
-    meta = metadata_map.get(slot_name, {})
-    caption = (
-        f"{prefix} <b>{slot_name}</b>\n"
-        f"└🎮 Sağlayıcı: {meta.get('provider', '—')}\n"
-        f"- Əsas RTP: {meta.get('base_rtp', '—')}%\n"
-        f"⚡️ Cari RTP: <b>{meta.get('instant_rtp', '—')}%</b>\n"
-        f"Həftəlik RTP: {meta.get('weekly_rtp', '—')}%"
-    )
+    # 2) buttons
+    kb = card_keyboard(lang, slot_name)
 
-    # 6) buttons & send
-    play_url = load_play_url()
-    kb = InlineKeyboardMarkup([[
-        InlineKeyboardButton(tpl["check_in"], url=play_url),
-        InlineKeyboardButton(tpl["back_slots"], callback_data="back_to_slots"),
-    ]])
-
-    msg = await query.message.reply_photo(
-        photo=slot["image"],
-        caption=caption,
-        parse_mode="HTML",
-        reply_markup=kb,
-    )
+    # 3) show the card in place of the menu, reusing Telegram's copy of
+    #    the image when we have its file_id
+    url, etag = slot["image"], slot.get("etag", "")
+    file_id = file_id_cache.get(url, etag)
+    try:
+        msg = await show_photo(query, file_id or url, ranking.captions[slot_name], kb)
+    except BadRequest:
+        if not file_id:
+            raise
+        # Telegram no longer knows this file_id; send from the CDN again
+        file_id_cache.forget(url)
+        file_id = None
+        msg = await show_photo(query, url, ranking.captions[slot_name], kb)
 
-    # 7) cache file_id as before
-    url = slot["image"]
-    if url not in FILE_ID_CACHE:
-        FILE_ID_CACHE[url] = msg.photo[-1].file_id
+    # 4) remember the file_id Telegram assigned to a fresh upload
+    if not file_id and msg.photo:
+        file_id_cache.put(url, etag, msg.photo[-1].file_id)
 
 
+@timed_handler("back_to_slots")
 async def back_to_slots(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
 
-    # 1) delete the existing message
-    try:
-        await query.message.delete()
-    except:
-        pass
-
-    # 2) re‐compute header
+    # today's prebuilt menu in place of the slot card
     lang = context.user_data.get('lang', 'AZ')
-    tpl = LANGUAGES[lang]
-    today = date.today().strftime("%d.%m.%Y")
-    header = tpl["top_slots"].format(today=today) + "\n\n" + tpl["description"]
-
-    # 3) load the raw slots and build a name→slot map
-    raw_slots = list_today_slots(lang)
-    slot_map = {s["name"]: s for s in raw_slots}
-
-    # 4) load your metadata.json keys in order, but only those actually present
-    meta_map = load_slot_metadata(lang)
-    ordered_names = [name for name in meta_map.keys() if name in slot_map]
-
-    # 5) build medalled buttons
-    medals = ["🥇", "🥈", "🥉"]
-    keyboard = []
-    for idx, name in enumerate(ordered_names):
-        prefix = medals[idx] if idx < 3 else f"{idx + 1}."
-        keyboard.append([InlineKeyboardButton(f"{prefix} {name}", callback_data=f"slot|{name}")])
-
-    # 6) append back-to-language
-    keyboard.append([InlineKeyboardButton("⬅️ Back", callback_data="back_to_language")])
-
-    # 7) send fresh menu
-    await query.message.reply_markdown(
-        header,
-        reply_markup=InlineKeyboardMarkup(keyboard),
-    )
+    ranking = await get_ranking(lang)
+    events.screen("back_to_slots", query.from_user.id, lang)
+    await show_text(query, ranking.header, ranking.keyboard)
+
+
+def preview_keyboard(segment: dict, recipients: int) -> InlineKeyboardMarkup:
+    """Send/Cancel under the preview, with the audience choices; the current ones are ticked."""
+    def option(label, key, value):
+        mark = "✅ " if segment.get(key) == value else ""
+        return InlineKeyboardButton(mark + label, callback_data=f"bcast_seg|{key}|{value or ''}")
+
+    return InlineKeyboardMarkup([
+        [option("All languages", "lang", None)] + [option(lang, "lang", lang) for lang in LANGUAGES],
+        [option("Any time", "days", None), option("Seen 7d", "days", 7), option("Seen 30d", "days", 30)],
+        [InlineKeyboardButton(f"📤 Send to {recipients}", callback_data="bcast_confirm"),
+         InlineKeyboardButton("❌ Cancel", callback_data="bcast_cancel")],
+    ])
 
 
+@timed_handler("bcast_callback")
 async def bcast_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     user_id = query.from_user.id
@@ -235,20 +193,45 @@ async def bcast_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # Type selected
     if query.data.startswith("bcast_type|"):
         btype = query.data.split("|")[1]
-        BROADCAST_STATE[user_id] = {"type": btype}
+        await start_draft(user_id, btype)
         await query.edit_message_text(f"Send the {'message' if btype == 'text' else btype} (text/photo/video/gif).")
         return
+    # Audience picked on the preview
+    if query.data.startswith("bcast_seg|"):
+        bcast = await get_draft(user_id)
+        if not bcast:
+            return await query.edit_message_text(DRAFT_EXPIRED)
+        _, key, value = query.data.split("|")
+        segment = bcast["segment"]
+        value = (int(value) if key == "days" else value) if value else None
+        if segment.get(key) == value:
+            return
+        if value is None:
+            segment.pop(key, None)
+        else:
+            segment[key] = value
+        await update_draft(user_id, segment=segment)
+        recipients = await count_recipients(segment, exclude=set(settings.ADMIN))
+        await query.edit_message_reply_markup(preview_keyboard(segment, recipients))
+        return
     # Confirm or cancel
     if query.data == "bcast_confirm":
-        await query.edit_message_text("Broadcast started...")
-        await do_broadcast(user_id, context)
-        BROADCAST_STATE.pop(user_id, None)
+        job = await confirm_draft(user_id)
+        if job is None:
+            return await query.edit_message_text(DRAFT_EXPIRED)
+        job_id, segment = job["id"], job["segment"] or {}
+        events.record("broadcast_created", user_id, lang=segment.get("lang"))
+        status_message = await query.edit_message_text(
+            f"Broadcast #{job_id} to {describe_segment(segment)} started..."
+        )
+        start_broadcast(context.bot, job_id, status_message)
         return
     if query.data == "bcast_cancel":
-        BROADCAST_STATE.pop(user_id, None)
+        await discard_draft(user_id)
         return await query.edit_message_text("Broadcast cancelled.")
 
 
+@timed_handler("broadcast")
 async def broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     if user_id not in settings.ADMIN:
@@ -259,20 +242,25 @@ async def broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE):
          InlineKeyboardButton("Video", callback_data="bcast_type|video"),
          InlineKeyboardButton("GIF", callback_data="bcast_type|animation")]
     ]
+    await discard_draft(user_id)
     await update.message.reply_text("What type of broadcast?", reply_markup=InlineKeyboardMarkup(keyboard))
-    BROADCAST_STATE[user_id] = {}
 
 
+@timed_handler("bcast_message")
 async def bcast_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
-    if user_id not in settings.ADMIN or user_id not in BROADCAST_STATE:
+    if user_id not in settings.ADMIN:
         return
-    bcast = BROADCAST_STATE[user_id]
-    btype = bcast.get("type")
-    preview_markup = InlineKeyboardMarkup([
-        [InlineKeyboardButton("✅ Send", callback_data="bcast_confirm"),
-         InlineKeyboardButton("❌ Cancel", callback_data="bcast_cancel")]
-    ])
+    bcast = await get_draft(user_id)
+    if bcast is None:
+        return
+    btype = bcast["type"]
+    # check the content before the recipient count costs a query
+    content = update.message.text if btype == "text" else getattr(update.message, btype, None)
+    if not content:
+        return await update.message.reply_text("Please send the correct type of content.")
+    segment = bcast["segment"]
+    preview_markup = preview_keyboard(segment, await count_recipients(segment, exclude=set(settings.ADMIN)))
     # Buttons for the broadcasted message
     btns = [
         [InlineKeyboardButton("🎮 Oynadığım sayt", url="https://toptdspup.com/ECaXmztG/")],
@@ -281,7 +269,7 @@ async def bcast_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     broadcast_markup = InlineKeyboardMarkup(btns)
     if btype == "text" and update.message.text:
         text = update.message.text
-        bcast.update({"text": text, "reply_markup": broadcast_markup})
+        await update_draft(user_id, text=text, reply_markup=broadcast_markup)
         await update.message.reply_text(
             f"**Preview:**\n{text}",
             reply_markup=preview_markup,
@@ -290,7 +278,7 @@ async def bcast_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     elif btype == "photo" and update.message.photo:
         file_id = update.message.photo[-1].file_id
         caption = update.message.caption or ""
-        bcast.update({"file_id": file_id, "caption": caption, "reply_markup": broadcast_markup})
+        await update_draft(user_id, file_id=file_id, caption=caption, reply_markup=broadcast_markup)
         await update.message.reply_photo(
             photo=file_id,
             caption=f"Preview:\n{caption}",
@@ -299,7 +287,7 @@ async def bcast_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     elif btype == "video" and update.message.video:
         file_id = update.message.video.file_id
         caption = update.message.caption or ""
-        bcast.update({"file_id": file_id, "caption": caption, "reply_markup": broadcast_markup})
+        await update_draft(user_id, file_id=file_id, caption=caption, reply_markup=broadcast_markup)
         await update.message.reply_video(
             video=file_id,
             caption=f"Preview:\n{caption}",
@@ -308,45 +296,134 @@ async def bcast_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     elif btype == "animation" and update.message.animation:
         file_id = update.message.animation.file_id
         caption = update.message.caption or ""
-        bcast.update({"file_id": file_id, "caption": caption, "reply_markup": broadcast_markup})
+        await update_draft(user_id, file_id=file_id, caption=caption, reply_markup=broadcast_markup)
         await update.message.reply_animation(
             animation=file_id,
             caption=f"Preview:\n{caption}",
             reply_markup=preview_markup
         )
-    else:
-        await update.message.reply_text("Please send the correct type of content.")
 
 
-async def do_broadcast(user_id, context):
-    bcast = BROADCAST_STATE.get(user_id)
-    if not bcast:
+@timed_handler("bcast_status")
+async def bcast_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_user.id not in settings.ADMIN:
+        return await update.message.reply_text("❌ Only admin can broadcast.")
+    jobs = await job_progress()
+    if not jobs:
+        return await update.message.reply_text("No broadcasts yet.")
+    lines = [
+        f"#{job['id']} {job['status']} ({describe_segment(job['segment'])}): "
+        f"{job['sent']} sent, {job['failed']} failed, {job['pending']} unconfirmed"
+        for job in jobs
+    ]
+    await update.message.reply_text("\n".join(lines))
+
+
+@timed_handler("stats")
+async def engagement_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_user.id not in settings.ADMIN:
         return
-    rows = await database.fetch_all("SELECT chat_id FROM users")
-    chat_ids = [r["chat_id"] for r in rows if r["chat_id"] not in settings.ADMIN]
-    sent = 0
-    markup = bcast.get("reply_markup")
-    for chat_id in chat_ids:
-        try:
-            if bcast["type"] == "text":
-                await context.bot.send_message(chat_id, text=bcast["text"], reply_markup=markup)
-            elif bcast["type"] == "photo":
-                await context.bot.send_photo(chat_id, photo=bcast["file_id"], caption=bcast["caption"], reply_markup=markup)
-            elif bcast["type"] == "video":
-                await context.bot.send_video(chat_id, video=bcast["file_id"], caption=bcast["caption"], reply_markup=markup)
-            elif bcast["type"] == "animation":
-                await context.bot.send_animation(chat_id, animation=bcast["file_id"], caption=bcast["caption"], reply_markup=markup)
-            sent += 1
-            await asyncio.sleep(0.04)  # 25/sec, safe for telegram
-        except RetryAfter as e:
-            await asyncio.sleep(e.retry_after + 1)
-        except Exception as e:
-            continue
-    await context.bot.send_message(user_id, f"Broadcast sent to {sent} users.")
+    days = int(context.args[0]) if context.args and context.args[0].isdigit() else 7
+    report = await engagement_report(days)
+    if not report["slots"] and not report["langs"]:
+        return await update.message.reply_text(f"No engagement data for the last {days} days yet.")
+    lines = [f"Last {days} days (rolled up every {settings.EVENT_ROLLUP_INTERVAL // 60} min)", ""]
+    for row in report["langs"]:
+        avg = f", {row['avg_menu_seconds']:.0f}s in menu" if row["avg_menu_seconds"] is not None else ""
+        lines.append(f"{row['lang']}: {row['menu_opens'] or 0} menu opens, {row['slot_opens'] or 0} slot opens{avg}")
+    lines.append("")
+    for row in report["slots"][:20]:
+        avg = f", {row['avg_seconds']:.0f}s on card" if row["avg_seconds"] is not None else ""
+        lines.append(f"{row['lang']} {row['slot']}: {row['opens'] or 0} opens, {row['plays'] or 0} plays{avg}")
+    await update.message.reply_text("\n".join(lines))
+
+
+async def do_broadcast(bot, job_id, status_message=None):
+    """
+    Runs (or resumes) a stored broadcast job. Recipients continue after
+    the job's cursor and every one is claimed in Postgres before it is
+    sent, so a crash never leads to a second copy.
+    """
+    job = await acquire_job(job_id)
+    if job is None:
+        return
+    bcast = job_to_bcast(job, bot)
+    log = DeliveryLog(job_id, batch_size=settings.BROADCAST_CLAIM_BATCH)
+
+    async def report(stats: BroadcastStats):
+        if status_message is not None:
+            await status_message.edit_text(
+                f"Broadcast #{job_id} in progress: {job['sent'] + stats.sent} sent, "
+                f"{job['failed'] + stats.failed} failed, {stats.rate:.1f} msg/s"
+            )
+
+    # sends go through the bulk connection pool, leaving the interactive one to users
+    sender = bulk_bot()
+    engine = BroadcastEngine(
+        lambda chat_id: send_broadcast_message(sender, chat_id, bcast),
+        concurrency=settings.BROADCAST_CONCURRENCY,
+        rate=settings.BROADCAST_RATE,
+        per_chat_interval=settings.BROADCAST_PER_CHAT_INTERVAL,
+        on_progress=report,
+        buffer_size=settings.BROADCAST_CLAIM_BATCH,
+        on_result=log.record,
+        # blocked/deleted chats are skipped by later broadcasts
+        on_unreachable=registrar.deactivate,
+    )
+    recipients = log.claimed_recipients(
+        bcast["segment"], after=job["cursor"], page_size=settings.BROADCAST_PAGE_SIZE, exclude=set(settings.ADMIN),
+    )
+    async with log:
+        stats = await engine.run(recipients)
+    logger.info(
+        "Broadcast #%s run finished: %d sent, %d failed, %d unconfirmed, %d retried in %.1fs (%.1f msg/s)",
+        job_id, stats.sent, stats.failed, stats.unknown, stats.retried, stats.elapsed, stats.rate,
+    )
+    events.record("broadcast_sent", lang=bcast["segment"].get("lang"), value=stats.sent)
+    done = await finish_job(job_id)
+    if done is not None:
+        await bot.send_message(
+            done["admin_id"],
+            f"Broadcast #{job_id} sent to {done['sent']} users ({done['failed']} failed, {stats.rate:.1f} msg/s).",
+        )
+
+
+# running broadcast tasks, kept so they are not garbage-collected mid-run
+_BROADCAST_TASKS: set[asyncio.Task] = set()
+
+
+def start_broadcast(bot, job_id, status_message=None) -> None:
+    """Runs the job in the background, outside the update handler."""
+    task = asyncio.create_task(do_broadcast(bot, job_id, status_message), name=f"Broadcast #{job_id}")
+    _BROADCAST_TASKS.add(task)
+    task.add_done_callback(_BROADCAST_TASKS.discard)
+    task.add_done_callback(log_task_failure)
+
+
+async def resume_broadcasts(bot) -> None:
+    """Picks up jobs left running by a crashed or redeployed worker."""
+    for job_id in await resumable_job_ids():
+        logger.info("Resuming broadcast #%s", job_id)
+        start_broadcast(bot, job_id)
 
 
 def create_bot():
-    application = ApplicationBuilder().token(settings.TELEGRAM_TOKEN).build()
+    persistence = UserStatePersistence(
+        cache_size=settings.USER_STATE_CACHE_SIZE,
+        update_interval=settings.USER_STATE_UPDATE_INTERVAL,
+    )
+    builder = (
+        ApplicationBuilder()
+        .token(settings.TELEGRAM_TOKEN)
+        .request(interactive_request())
+        .get_updates_request(get_updates_request())
+        .persistence(persistence)
+    )
+    if settings.TELEGRAM_BASE_URL:
+        builder.base_url(settings.TELEGRAM_BASE_URL)
+    application = builder.build()
+    persistence.application = application
+    application.add_handler(TypeHandler(Update, track_activity), group=-1)
     application.add_handler(CommandHandler('start', start))
     application.add_handler(CallbackQueryHandler(choose_language, pattern=r'^lang\|'))
     application.add_handler(CallbackQueryHandler(choose_slot, pattern=r'^slot\|'))
@@ -354,6 +431,8 @@ def create_bot():
     application.add_handler(CallbackQueryHandler(back_to_slots, pattern=r'^back_to_slots$'))
     # BROADCAST
     application.add_handler(CommandHandler('broadcast', broadcast))
+    application.add_handler(CommandHandler('bstatus', bcast_status))
+    application.add_handler(CommandHandler('stats', engagement_stats))
     application.add_handler(CallbackQueryHandler(bcast_callback, pattern=r'^bcast_'))
     application.add_handler(MessageHandler(filters.ALL, bcast_message))
     return application
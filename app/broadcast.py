@@ -0,0 +1,270 @@
+# app/broadcast.py
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import AsyncIterable, AsyncIterator, Awaitable, Callable, Optional
+import httpx
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter, TimedOut
+from app.logs import log_event
+from app.metrics import BROADCAST_MESSAGES, BROADCAST_RATE
+from app.queries import MIN_CHAT_ID, queries
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """
+    Async token bucket: `rate` tokens per second, bursts up to `capacity`.
+    `pause()` blocks every caller until the deadline, which is how a
+    RetryAfter from Telegram backs off all senders at once.
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float) -> None:
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        # nothing saved up during a flood-wait may be spent right after it:
+        # refilling starts when the pause ends
+        self._tokens = 0.0
+        self._updated = self._paused_until
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+@dataclass
+class BroadcastStats:
+    sent: int = 0
+    failed: int = 0
+    # timed out after the request went out: maybe delivered, never resent
+    unknown: int = 0
+    retried: int = 0
+    started_at: float = field(default_factory=time.monotonic)
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+    @property
+    def rate(self) -> float:
+        """Delivered messages per second since the broadcast started."""
+        return self.sent / self.elapsed if self.elapsed > 0 else 0.0
+
+
+def _unreachable(error: Exception) -> bool:
+    """Forbidden (blocked, deactivated) or a chat Telegram no longer knows."""
+    return isinstance(error, Forbidden) or "chat not found" in str(error).lower()
+
+
+@dataclass
+class _Recipient:
+    chat_id: int
+    attempt: int = 0
+    not_before: float = 0.0
+
+
+class BroadcastEngine:
+    """
+    Sends one message to many chats with a bounded pool of concurrent
+    senders. A shared token bucket keeps the total under Telegram's global
+    limit, and a recipient is never retried sooner than `per_chat_interval`
+    after its previous attempt. RetryAfter pauses every sender and puts the
+    recipient back on the queue instead of dropping it. Chats that can
+    never be reached again are passed to `on_unreachable`.
+
+    Recipients are pulled from an async iterable with at most `buffer_size`
+    fresh ones queued at a time, so sending starts with the first page and
+    memory stays flat however many chats there are.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[int], Awaitable[None]],
+        *,
+        concurrency: int,
+        rate: float,
+        per_chat_interval: float = 1.0,
+        max_attempts: int = 5,
+        on_progress: Optional[Callable[[BroadcastStats], Awaitable[None]]] = None,
+        progress_interval: float = 5.0,
+        buffer_size: int = 1000,
+        on_result: Optional[Callable[[int, str, Optional[str]], None]] = None,
+        on_unreachable: Optional[Callable[[int], None]] = None,
+    ):
+        self.send = send
+        self.concurrency = concurrency
+        self.bucket = TokenBucket(rate)
+        self.per_chat_interval = per_chat_interval
+        self.max_attempts = max_attempts
+        self.on_progress = on_progress
+        self.progress_interval = progress_interval
+        self.on_result = on_result
+        self.on_unreachable = on_unreachable
+        self.stats = BroadcastStats()
+        self._queue: asyncio.Queue[_Recipient] = asyncio.Queue()
+        # caps fresh recipients in flight; retries bypass it so a worker
+        # re-queueing one can never block behind the producer
+        self._buffer = asyncio.Semaphore(buffer_size)
+
+    def _finish(self, chat_id: int, error: Optional[str] = None, status: str = None) -> None:
+        """Records the outcome: "sent", "failed" or "unknown"."""
+        status = status or ("sent" if error is None else "failed")
+        setattr(self.stats, status, getattr(self.stats, status) + 1)
+        BROADCAST_MESSAGES.inc(result=status)
+        BROADCAST_RATE.set(self.stats.rate)
+        if self.on_result:
+            self.on_result(chat_id, status, error)
+
+    def _retry(self, recipient: _Recipient, error: str, delay: float = 0.0) -> None:
+        recipient.attempt += 1
+        if recipient.attempt >= self.max_attempts:
+            logger.warning("Broadcast to %s gave up after %d attempts", recipient.chat_id, recipient.attempt)
+            self._finish(recipient.chat_id, error)
+            return
+        recipient.not_before = time.monotonic() + max(delay, self.per_chat_interval)
+        self.stats.retried += 1
+        BROADCAST_MESSAGES.inc(result="retried")
+        self._queue.put_nowait(recipient)
+
+    async def _deliver(self, recipient: _Recipient) -> None:
+        wait = recipient.not_before - time.monotonic()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        await self.bucket.acquire()
+        try:
+            await self.send(recipient.chat_id)
+        except RetryAfter as e:
+            logger.info("Flood limit hit, pausing broadcast for %ss", e.retry_after)
+            self.bucket.pause(e.retry_after)
+            self._retry(recipient, str(e), e.retry_after)
+        except (Forbidden, BadRequest) as e:
+            # blocked the bot, deleted account, bad chat id: retrying won't help
+            log_event(logger, "broadcast.failed", chat_id=recipient.chat_id, error=str(e))
+            self._finish(recipient.chat_id, str(e))
+            if self.on_unreachable and _unreachable(e):
+                self.on_unreachable(recipient.chat_id)
+        except TimedOut as e:
+            if isinstance(e.__cause__, (httpx.ConnectTimeout, httpx.PoolTimeout)):
+                # the request never left, so it is safe to send again
+                log_event(logger, "broadcast.network_error", chat_id=recipient.chat_id, error=repr(e.__cause__))
+                self._retry(recipient, str(e))
+                return
+            # Telegram has probably accepted it already; resending could
+            # deliver it twice, so it is recorded like a crash mid-send
+            log_event(logger, "broadcast.timed_out", chat_id=recipient.chat_id, error=str(e))
+            self._finish(recipient.chat_id, str(e), status="unknown")
+        except NetworkError as e:
+            log_event(logger, "broadcast.network_error", chat_id=recipient.chat_id, error=str(e))
+            self._retry(recipient, str(e))
+        except Exception as e:
+            logger.exception("Broadcast to %s failed", recipient.chat_id)
+            self._finish(recipient.chat_id, repr(e))
+        else:
+            self._finish(recipient.chat_id)
+
+    async def _worker(self) -> None:
+        while True:
+            recipient = await self._queue.get()
+            fresh = recipient.attempt == 0
+            try:
+                await self._deliver(recipient)
+            finally:
+                if fresh:
+                    self._buffer.release()
+                self._queue.task_done()
+
+    async def _report(self) -> None:
+        while True:
+            await asyncio.sleep(self.progress_interval)
+            try:
+                await self.on_progress(self.stats)
+            except Exception:
+                logger.exception("Broadcast progress callback failed")
+
+    async def run(self, chat_ids: AsyncIterable[int]) -> BroadcastStats:
+        tasks = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+        if self.on_progress:
+            tasks.append(asyncio.create_task(self._report()))
+        try:
+            async for chat_id in chat_ids:
+                await self._buffer.acquire()
+                self._queue.put_nowait(_Recipient(chat_id))
+            await self._queue.join()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            BROADCAST_RATE.set(0)
+        return self.stats
+
+
+def _segment_args(segment: dict) -> tuple[Optional[str], Optional[int]]:
+    """(lang, days) for the recipient statements; None leaves a filter off."""
+    return segment.get("lang") or None, int(segment["days"]) if segment.get("days") else None
+
+
+def describe_segment(segment: Optional[dict]) -> str:
+    segment = segment or {}
+    parts = [f"{segment.get('lang') or 'all'} users"]
+    if segment.get("days"):
+        parts.append(f"seen in the last {segment['days']} days")
+    return ", ".join(parts)
+
+
+async def count_recipients(segment: dict, exclude: set = frozenset()) -> int:
+    """Active users a broadcast to `segment` would reach, not counting `exclude`."""
+    return await queries.fetchval("count_recipients", *_segment_args(segment), list(exclude))
+
+
+async def iter_recipient_pages(page_size: int = 1000, after: int = None,
+                               segment: dict = None) -> AsyncIterator[list[int]]:
+    """
+    Yields chat_ids in chat_id order, one keyset page at a time
+    (`WHERE chat_id > last ORDER BY chat_id LIMIT n`), so each page is an
+    index range scan and nothing beyond one page is held in memory.
+    Pass `after` to continue from a known chat_id, and `segment`
+    ({"lang": ..., "days": ...}) to get only the active users it selects
+    instead of every registered one.
+    """
+    last = MIN_CHAT_ID if after is None else after
+    while True:
+        if segment is None:
+            rows = await queries.fetch("user_ids_page", last, page_size)
+        else:
+            rows = await queries.fetch("recipients_page", last, *_segment_args(segment), page_size)
+        if rows:
+            yield [row["chat_id"] for row in rows]
+        if len(rows) < page_size:
+            return
+        last = rows[-1]["chat_id"]
+
+
+async def send_broadcast_message(bot, chat_id: int, bcast: dict) -> None:
+    """Sends one recipient the text/photo/video/animation held in `bcast`."""
+    markup = bcast.get("reply_markup")
+    if bcast["type"] == "text":
+        await bot.send_message(chat_id, text=bcast["text"], reply_markup=markup)
+    elif bcast["type"] == "photo":
+        await bot.send_photo(chat_id, photo=bcast["file_id"], caption=bcast["caption"], reply_markup=markup)
+    elif bcast["type"] == "video":
+        await bot.send_video(chat_id, video=bcast["file_id"], caption=bcast["caption"], reply_markup=markup)
+    elif bcast["type"] == "animation":
+        await bot.send_animation(chat_id, animation=bcast["file_id"], caption=bcast["caption"], reply_markup=markup)
@@ -0,0 +1,252 @@
+# app/broadcast_jobs.py
+from datetime import timedelta
+from typing import AsyncIterator, Optional
+from sqlalchemy import Integer, column, delete, func, insert, select, text, update
+from telegram import InlineKeyboardMarkup
+from app.batching import BatchWriter
+from app.broadcast import iter_recipient_pages
+from app.config import settings
+from app.coordination import WORKER_ID
+from app.database import database
+from app.models import BroadcastJob
+
+
+class LeaseLost(Exception):
+    """Another worker took over the job (our lease expired)."""
+
+
+# An admin's broadcast in progress is a broadcast_jobs row with status
+# 'draft', so every step of the dialog can land on any worker. Confirming
+# turns the draft into the running job. A draft left alone for
+# BROADCAST_DRAFT_TTL seconds (created_at doubles as its last change) is
+# ignored, and deleted by the admin's next /broadcast.
+
+
+def _drafts_of(admin_id: int):
+    return (BroadcastJob.admin_id == admin_id) & (BroadcastJob.status == "draft")
+
+
+def _draft_of(admin_id: int):
+    """The admin's draft, unless it has expired."""
+    cutoff = func.now() - timedelta(seconds=settings.BROADCAST_DRAFT_TTL)
+    return _drafts_of(admin_id) & (BroadcastJob.created_at > cutoff)
+
+
+async def start_draft(admin_id: int, btype: str) -> None:
+    """Replaces the admin's draft (if any) with an empty one of type `btype`."""
+    async with database.transaction():
+        await database.execute(delete(BroadcastJob).where(_drafts_of(admin_id)))
+        await database.execute(insert(BroadcastJob).values(admin_id=admin_id, type=btype, segment={}, status="draft"))
+
+
+async def get_draft(admin_id: int) -> Optional[dict]:
+    """The admin's draft in job_to_bcast form, or None."""
+    row = await database.fetch_one(select(BroadcastJob).where(_draft_of(admin_id)))
+    return job_to_bcast(row, None) if row is not None else None
+
+
+async def update_draft(admin_id: int, **values) -> bool:
+    """Sets content (text/file_id/caption/reply_markup) or segment; False if there is no draft."""
+    if values.get("reply_markup") is not None:
+        values["reply_markup"] = values["reply_markup"].to_dict()
+    stmt = (
+        update(BroadcastJob).where(_draft_of(admin_id))
+        .values(**values, created_at=func.now()).returning(BroadcastJob.id)
+    )
+    return await database.fetch_val(stmt) is not None
+
+
+async def discard_draft(admin_id: int) -> None:
+    await database.execute(delete(BroadcastJob).where(_drafts_of(admin_id)))
+
+
+async def confirm_draft(admin_id: int):
+    """
+    Starts the admin's draft if it has content and returns (id, segment).
+    The update is atomic, so a double tap (or two workers) starts it once.
+    """
+    stmt = (
+        update(BroadcastJob)
+        .where(_draft_of(admin_id) & (BroadcastJob.text.isnot(None) | BroadcastJob.file_id.isnot(None)))
+        .values(status="running", created_at=func.now())
+        .returning(BroadcastJob.id, BroadcastJob.segment)
+    )
+    return await database.fetch_one(stmt)
+
+
+async def acquire_job(job_id: int):
+    """
+    Takes the lease on a running job and returns its row, or None if the job
+    is finished or another live worker holds it. Deliveries a previous
+    worker claimed but never confirmed are marked `unknown`: they may have
+    gone out before the crash, so they are not sent again.
+    """
+    owner = await database.fetch_val(
+        """
+        UPDATE broadcast_jobs
+        SET lease_owner = :owner, lease_until = now() + make_interval(secs => :ttl)
+        WHERE id = :job_id AND status = 'running'
+          AND (lease_until IS NULL OR lease_until < now() OR lease_owner = :owner)
+        RETURNING lease_owner
+        """,
+        {"job_id": job_id, "owner": WORKER_ID, "ttl": float(settings.BROADCAST_LEASE_TTL)},
+    )
+    if owner is None:
+        return None
+    await database.execute(
+        "UPDATE broadcast_deliveries SET status = 'unknown', updated_at = now() "
+        "WHERE job_id = :job_id AND status = 'claimed'",
+        {"job_id": job_id},
+    )
+    return await database.fetch_one(select(BroadcastJob).where(BroadcastJob.id == job_id))
+
+
+async def finish_job(job_id: int):
+    return await database.fetch_one(
+        """
+        UPDATE broadcast_jobs
+        SET status = 'done', finished_at = now(), lease_owner = NULL, lease_until = NULL
+        WHERE id = :job_id AND lease_owner = :owner
+        RETURNING id, admin_id, sent, failed
+        """,
+        {"job_id": job_id, "owner": WORKER_ID},
+    )
+
+
+async def resumable_job_ids() -> list[int]:
+    """Running jobs whose worker stopped renewing its lease."""
+    rows = await database.fetch_all(
+        "SELECT id FROM broadcast_jobs WHERE status = 'running' "
+        "AND (lease_until IS NULL OR lease_until < now()) ORDER BY id"
+    )
+    return [r["id"] for r in rows]
+
+
+async def job_progress(limit: int = 5) -> list:
+    """Latest jobs with their delivery counters, newest first."""
+    # typed columns, so `segment` comes back decoded rather than as JSON text
+    query = text(
+        """
+        SELECT j.id, j.status, j.segment, j.sent, j.failed, j.created_at, j.finished_at,
+               (SELECT count(*) FROM broadcast_deliveries d
+                WHERE d.job_id = j.id AND d.status IN ('claimed', 'unknown')) AS pending
+        FROM broadcast_jobs j
+        WHERE j.status <> 'draft'
+        ORDER BY j.id DESC
+        LIMIT :limit
+        """
+    ).bindparams(limit=limit).columns(
+        *(getattr(BroadcastJob, c) for c in ("id", "status", "segment", "sent", "failed", "created_at", "finished_at")),
+        column("pending", Integer),
+    )
+    return await database.fetch_all(query)
+
+
+def job_to_bcast(job, bot) -> dict:
+    """Rebuilds the dict send_broadcast_message expects."""
+    return {
+        "type": job["type"],
+        "text": job["text"],
+        "file_id": job["file_id"],
+        "caption": job["caption"],
+        "reply_markup": InlineKeyboardMarkup.de_json(job["reply_markup"], bot) if job["reply_markup"] else None,
+        # jobs from before segments existed went to everyone
+        "segment": job["segment"] or {},
+    }
+
+
+class DeliveryLog(BatchWriter):
+    """
+    Durable per-recipient state for one job. Recipients are claimed in
+    batches before they are handed to the senders, and outcomes are
+    buffered and written back in batches (every `batch_size` results or
+    `flush_interval` seconds). Each flush also renews the job's lease.
+    """
+
+    fatal = (LeaseLost,)
+
+    def __init__(self, job_id: int, batch_size: int, flush_interval: float = 2.0):
+        super().__init__(flush_interval)
+        self.job_id = job_id
+        self.batch_size = batch_size
+
+    async def __aenter__(self):
+        self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+    def record(self, chat_id: int, status: str, error: Optional[str]) -> None:
+        """BroadcastEngine on_result hook."""
+        self._buffer.append((chat_id, status, error))
+        if len(self._buffer) >= self.batch_size:
+            self.flush_soon()
+
+    async def claim(self, chat_ids: list[int], cursor: int) -> list[int]:
+        """Claims `chat_ids` and advances the job cursor; returns the ids claimed."""
+        async with database.transaction():
+            rows = await database.fetch_all(
+                """
+                INSERT INTO broadcast_deliveries (job_id, chat_id, status)
+                SELECT :job_id, chat_id, 'claimed' FROM unnest(CAST(:chat_ids AS BIGINT[])) AS chat_id
+                ON CONFLICT DO NOTHING
+                RETURNING chat_id
+                """,
+                {"job_id": self.job_id, "chat_ids": chat_ids},
+            )
+            await self._renew("cursor = :cursor, ", {"cursor": cursor})
+        return [r["chat_id"] for r in rows]
+
+    async def claimed_recipients(self, segment: dict, after: int = None, page_size: int = 1000,
+                                 exclude: set = frozenset()) -> AsyncIterator[int]:
+        """`segment`'s recipients after `after`, each claimed before it is yielded."""
+        async for page in iter_recipient_pages(page_size, after=after, segment=segment):
+            for i in range(0, len(page), self.batch_size):
+                chunk = page[i:i + self.batch_size]
+                wanted = [c for c in chunk if c not in exclude]
+                for chat_id in await self.claim(wanted, cursor=chunk[-1]):
+                    yield chat_id
+
+    async def flush(self) -> None:
+        if self._buffer:
+            await super().flush()
+        else:
+            # nothing finished since the last flush; keep the lease anyway
+            await self._renew()
+
+    async def _write(self, results: list[tuple[int, str, Optional[str]]]) -> None:
+        async with database.transaction():
+            await database.execute(
+                """
+                UPDATE broadcast_deliveries AS d
+                SET status = u.status, error = u.error, updated_at = now()
+                FROM unnest(CAST(:chat_ids AS BIGINT[]), CAST(:statuses AS TEXT[]), CAST(:errors AS TEXT[]))
+                     AS u(chat_id, status, error)
+                WHERE d.job_id = :job_id AND d.chat_id = u.chat_id
+                """,
+                {
+                    "job_id": self.job_id,
+                    "chat_ids": [r[0] for r in results],
+                    "statuses": [r[1] for r in results],
+                    "errors": [r[2] for r in results],
+                },
+            )
+            # "unknown" rows count as neither; /bstatus shows them as unconfirmed
+            await self._renew(
+                "sent = sent + :sent, failed = failed + :failed, ",
+                {"sent": sum(1 for r in results if r[1] == "sent"),
+                 "failed": sum(1 for r in results if r[1] == "failed")},
+            )
+
+    async def _renew(self, assignments: str = "", values: dict = None) -> None:
+        # every write to the job row doubles as a lease heartbeat
+        values = values or {}
+        job_id = await database.fetch_val(
+            "UPDATE broadcast_jobs SET " + assignments
+            + "lease_until = now() + make_interval(secs => :ttl) "
+            "WHERE id = :job_id AND lease_owner = :owner RETURNING id",
+            {**values, "job_id": self.job_id, "owner": WORKER_ID, "ttl": float(settings.BROADCAST_LEASE_TTL)},
+        )
+        if job_id is None:
+            raise LeaseLost(f"broadcast job {self.job_id} is now owned by another worker")
@@ -0,0 +1,140 @@
+# app/capture.py
+import asyncio
+import gzip
+import hashlib
+import hmac
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Optional
+from app.batching import BatchWriter
+
+# objects whose "id" identifies a person or chat
+_ID_OWNERS = {
+    "from", "chat", "user", "sender_chat", "forward_from", "forward_from_chat", "via_bot",
+    "new_chat_members", "left_chat_member",
+}
+_NAME_FIELDS = {"first_name", "last_name", "username", "title", "phone_number", "bio", "email"}
+_TEXT_FIELDS = {"text", "caption"}
+_DROPPED = {"location", "venue", "contact"}
+
+
+class Scrubber:
+    """
+    Pseudonymises an update in place of its PII: user and chat ids map to
+    stable fake ids (so per-chat ordering and repeat visits survive), names
+    to stable tokens, and free text to bullets of the same length. Commands
+    keep their first word. Locations and contacts are dropped.
+    """
+
+    def __init__(self, key: bytes):
+        self.key = key
+
+    def _digest(self, value: Any) -> bytes:
+        return hmac.new(self.key, str(value).encode(), hashlib.sha256).digest()
+
+    def _id(self, value: int) -> int:
+        fake = int.from_bytes(self._digest(value)[:5], "big") + 1
+        # keep negative (group/channel) ids negative
+        return -fake if value < 0 else fake
+
+    def _text(self, text: str) -> str:
+        if text.startswith("/"):
+            return text.split(maxsplit=1)[0]
+        return "•" * len(text)
+
+    def scrub(self, value: Any, owner: str = None) -> Any:
+        if isinstance(value, list):
+            return [self.scrub(v, owner) for v in value]
+        if not isinstance(value, dict):
+            return value
+        out = {}
+        for key, item in value.items():
+            if key in _DROPPED:
+                continue
+            if key == "id" and owner in _ID_OWNERS and isinstance(item, int):
+                out[key] = self._id(item)
+            elif key == "user_id" and isinstance(item, int):
+                out[key] = self._id(item)
+            elif key in _NAME_FIELDS and isinstance(item, str):
+                out[key] = f"{key}-{self._digest(item).hex()[:8]}"
+            elif key in _TEXT_FIELDS and isinstance(item, str):
+                out[key] = self._text(item)
+            else:
+                out[key] = self.scrub(item, key)
+        return out
+
+
+class UpdateCapture(BatchWriter):
+    """
+    Appends raw webhook updates with their arrival time to gzipped JSON-lines
+    files in `directory`, for bench/replay.py, writing from a thread. Files
+    roll over after `max_bytes` and only the newest `keep` are kept.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, keep: int, scrubber: Optional[Scrubber],
+                 flush_interval: float = 1.0):
+        super().__init__(flush_interval)
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.keep = keep
+        self.scrubber = scrubber
+        self._file: Optional[gzip.GzipFile] = None
+        self._written = 0
+        self._files = 0
+
+    def start(self) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        super().start()
+
+    async def stop(self) -> None:
+        await super().stop()
+        if self._file is not None:
+            await asyncio.to_thread(self._file.close)
+            self._file = None
+
+    def record(self, update: dict) -> None:
+        if self.scrubber is not None:
+            update = self.scrubber.scrub(update)
+        self._buffer.append(json.dumps({"t": time.time(), "update": update}, ensure_ascii=False, separators=(",", ":")))
+
+    def _put_back(self, batch: list[str]) -> None:
+        # best effort: a batch the disk refused is dropped
+        pass
+
+    async def _write(self, lines: list[str]) -> None:
+        await asyncio.to_thread(self._append, lines)
+
+    def _append(self, lines: list[str]) -> None:
+        if self._file is None or self._written >= self.max_bytes:
+            self._rotate()
+        data = ("\n".join(lines) + "\n").encode("utf-8")
+        self._file.write(data)
+        # a sync flush, so a crash loses at most one batch
+        self._file.flush()
+        self._written += len(data)
+
+    def _rotate(self) -> None:
+        if self._file is not None:
+            self._file.close()
+        self._files += 1
+        name = f"updates-{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-{self._files:04d}.jsonl.gz"
+        self._file = gzip.open(self.directory / name, "wb")
+        self._written = 0
+        # names sort by time; other workers' files count towards `keep` too
+        files = sorted(self.directory.glob("updates-*.jsonl.gz"))
+        for old in files[:-self.keep]:
+            old.unlink(missing_ok=True)
+
+
+def iter_capture(path) -> Any:
+    """Yields the {"t", "update"} entries of one capture file."""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        try:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        except (EOFError, json.JSONDecodeError):
+            # the file is still being written, or its writer crashed mid-batch
+            return
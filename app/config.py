@@ -1,3 +1,4 @@
+from typing import Optional
 from pydantic import BaseSettings
 
 
@@ -12,11 +13,153 @@ class Settings(BaseSettings):
     SPACES_REGION: str
     SPACES_NAME: str
 
+    # Alternative Bot API and S3 endpoints, e.g. the local stand-ins used by
+    # the benchmarks ("http://127.0.0.1:8081/bot", "http://127.0.0.1:9000").
+    TELEGRAM_BASE_URL: Optional[str] = None
+    SPACES_ENDPOINT_URL: Optional[str] = None
+
+    # Seconds a cached per-language catalog is served before it is
+    # refreshed in the background (stale-while-revalidate).
+    CATALOG_TTL: int = 300
+    # Seconds between conditional GETs of metadata.json and play_url.txt.
+    REVALIDATE_INTERVAL: int = 60
+
+    # Broadcast sender pool: concurrent senders, global messages/sec and
+    # the minimum gap between two attempts to the same chat.
+    BROADCAST_CONCURRENCY: int = 8
+    BROADCAST_RATE: float = 25.0
+    BROADCAST_PER_CHAT_INTERVAL: float = 1.0
+    # Recipients fetched per keyset page (and queued ahead of the senders).
+    BROADCAST_PAGE_SIZE: int = 1000
+    # Recipients claimed (and delivery statuses written) per batch, and how
+    # long a worker's claim on a running job lasts without a heartbeat.
+    BROADCAST_CLAIM_BATCH: int = 100
+    BROADCAST_LEASE_TTL: int = 60
+    # Seconds an untouched broadcast draft stays open for its admin.
+    BROADCAST_DRAFT_TTL: int = 3600
+
+    # asyncpg pool for the per-update queries (app/queries.py): its size,
+    # seconds a query may wait for a free connection, and each connection's
+    # statement cache. 0 turns prepared statements off, as PgBouncer in
+    # transaction mode needs. The `databases` pool used for everything else
+    # is sized by DB_POOL_MIN_SIZE/DB_POOL_MAX_SIZE, read in app/database.py.
+    #
+    # Each worker holds up to PG_POOL_MAX_SIZE + DB_POOL_MAX_SIZE + 1 (the
+    # LISTEN connection in app/coordination.py) Postgres connections, 9 by
+    # default. Keep workers x that under the server's limit: DigitalOcean's
+    # smallest managed plans allow about 22, so two workers fit.
+    PG_POOL_MIN_SIZE: int = 1
+    PG_POOL_MAX_SIZE: int = 4
+    PG_POOL_TIMEOUT: float = 5.0
+    PG_STATEMENT_CACHE_SIZE: int = 100
+
+    # Webhook update queue: consumer tasks, total queued updates, seconds the
+    # webhook waits for room, and whether a full queue drops the update (200)
+    # instead of asking Telegram to redeliver it later (503).
+    UPDATE_WORKERS: int = 8
+    UPDATE_QUEUE_SIZE: int = 1000
+    UPDATE_QUEUE_TIMEOUT: float = 1.0
+    UPDATE_SHED_WHEN_FULL: bool = False
+
+    # Bot API HTTP transport. User-facing replies and broadcast sends use
+    # separate connection pools; a full bulk pool makes senders wait for
+    # up to TELEGRAM_BULK_POOL_TIMEOUT. HTTP "2" needs
+    # python-telegram-bot[http2].
+    TELEGRAM_POOL_SIZE: int = 32
+    TELEGRAM_POOL_TIMEOUT: float = 1.0
+    TELEGRAM_BULK_POOL_SIZE: int = 8
+    TELEGRAM_BULK_POOL_TIMEOUT: float = 10.0
+    TELEGRAM_KEEPALIVE_EXPIRY: float = 30.0
+    TELEGRAM_HTTP_VERSION: str = "1.1"
+    TELEGRAM_CONNECT_TIMEOUT: float = 5.0
+    TELEGRAM_READ_TIMEOUT: float = 5.0
+    TELEGRAM_WRITE_TIMEOUT: float = 5.0
+
+    # New users are inserted in batches of this size, or at least this often.
+    REGISTER_BATCH_SIZE: int = 200
+    REGISTER_FLUSH_INTERVAL: float = 2.0
+    # users.last_seen is written at most once per user in this many seconds.
+    LAST_SEEN_RESOLUTION: int = 3600
+
+    # Most image file_ids kept in memory (and loaded at startup).
+    FILE_ID_CACHE_SIZE: int = 1000
+
+    # Catalog prewarming: seconds between passes, hours before midnight to
+    # start looking for the next day's images, and a private chat the bot
+    # uploads new slot photos to once so their file_ids are ready.
+    PREWARM_INTERVAL: int = 300
+    PREWARM_LEAD_HOURS: float = 3.0
+    WARMUP_CHAT_ID: Optional[int] = None
+
+    # Telegram-sized slot images (app/images.py): longest side and JPEG
+    # quality of the .tg.jpg variants, whether the bot sends them instead of
+    # the originals, and whether the prewarmer makes them for newly
+    # published images (needs Pillow).
+    IMAGE_MAX_SIDE: int = 1280
+    IMAGE_QUALITY: int = 85
+    SERVE_IMAGE_VARIANTS: bool = True
+    OPTIMIZE_ON_PUBLISH: bool = False
+
+    # Per-user state (chosen language): users kept in memory, and seconds
+    # between persistence rounds that write changed languages to Postgres.
+    USER_STATE_CACHE_SIZE: int = 50000
+    USER_STATE_UPDATE_INTERVAL: float = 5.0
+
+    # Redelivered updates are dropped by update_id: the last DEDUP_WINDOW ids
+    # are remembered in memory and, with DEDUP_DURABLE, claimed in Postgres
+    # (processed_updates, kept DEDUP_TTL seconds) so all workers agree.
+    DEDUP_WINDOW: int = 10000
+    DEDUP_DURABLE: bool = False
+    DEDUP_TTL: int = 86400
+
+    # Opt-in capture of raw webhook updates for bench/replay.py: gzip
+    # JSON-lines files in CAPTURE_DIR, a new file every CAPTURE_MAX_MB of
+    # JSON, the newest CAPTURE_FILES kept. Ids, names and free text are
+    # pseudonymised unless CAPTURE_SCRUB_PII is turned off.
+    CAPTURE_DIR: Optional[str] = None
+    CAPTURE_MAX_MB: int = 64
+    CAPTURE_FILES: int = 20
+    CAPTURE_SCRUB_PII: bool = True
+
+    # Logging: root level, per-logger levels ("httpx=WARNING,app.bot=DEBUG"),
+    # sample rates for hot-path events ("webhook.update=0.01" keeps 1%),
+    # and one chat whose raw updates are always logged in full.
+    LOG_LEVEL: str = "INFO"
+    LOG_LEVELS: str = "httpx=WARNING"
+    LOG_SAMPLE: str = "webhook.update=0.01,broadcast.failed=0.01,broadcast.network_error=0.1"
+    LOG_DEBUG_CHAT_ID: Optional[int] = None
+
+    # Engagement events (app/events.py): COPYed to Postgres in batches of
+    # EVENT_BATCH_SIZE or every EVENT_FLUSH_INTERVAL seconds, with at most
+    # EVENT_BUFFER_MAX held while Postgres is unreachable. Daily rollups are
+    # rebuilt every EVENT_ROLLUP_INTERVAL seconds, raw events are dropped
+    # after EVENT_RETENTION_DAYS, and time on a screen only counts up to
+    # EVENT_SESSION_GAP seconds.
+    EVENT_BATCH_SIZE: int = 1000
+    EVENT_FLUSH_INTERVAL: float = 5.0
+    EVENT_BUFFER_MAX: int = 100000
+    EVENT_ROLLUP_INTERVAL: int = 600
+    EVENT_RETENTION_DAYS: int = 90
+    EVENT_SESSION_GAP: int = 1800
+    # TRACK_PLAY_CLICKS=true makes the play button open <PUBLIC_URL>/go/play/...
+    # (PUBLIC_URL defaults to WEBHOOK_URL's origin), which counts the click
+    # and redirects to the play URL. Off by default: the button links the
+    # play URL directly.
+    PUBLIC_URL: Optional[str] = None
+    TRACK_PLAY_CLICKS: bool = False
+
     ADMIN = [495956176, 2083712739]
 
     class Config:
         env_file = ".env"
 
+    @property
+    def public_url(self) -> str:
+        if self.PUBLIC_URL:
+            return self.PUBLIC_URL.rstrip("/")
+        scheme, _, rest = self.WEBHOOK_URL.partition("://")
+        return f"{scheme}://{rest.split('/', 1)[0]}"
+
     @property
     def cdn_base(self) -> str:
         # dynamically derive the CDN hostname
@@ -0,0 +1,117 @@
+# app/coordination.py
+import asyncio
+import json
+import logging
+import os
+import socket
+from typing import Any, Callable, Optional
+import asyncpg
+from app.batching import log_task_failure
+from app.config import settings
+from app.database import database
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "rtp_bot_events"
+# identifies this process; a worker ignores the events it published itself
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+# Postgres rejects NOTIFY payloads of 8000 bytes or more
+_MAX_PAYLOAD = 7900
+
+_HANDLERS: dict[str, list[Callable[[Any], None]]] = {}
+_TASKS: set[asyncio.Task] = set()
+
+
+def subscribe(event: str, handler: Callable[[Any], None]) -> None:
+    """Calls `handler(data)` whenever another worker publishes `event`."""
+    _HANDLERS.setdefault(event, []).append(handler)
+
+
+async def publish(event: str, data: Any) -> None:
+    # unescaped: "ə" is 2 bytes of UTF-8 but 6 as "\u0259"
+    payload = json.dumps({"event": event, "worker": WORKER_ID, "data": data}, ensure_ascii=False)
+    size = len(payload.encode("utf-8"))
+    if size > _MAX_PAYLOAD:
+        logger.warning("Dropping oversized %s notification (%d bytes)", event, size)
+        return
+    await database.execute("SELECT pg_notify(:channel, :payload)", {"channel": CHANNEL, "payload": payload})
+
+
+def notify(event: str, data: Any) -> None:
+    """Fire-and-forget `publish` for sync code; a no-op outside the event loop."""
+    try:
+        task = asyncio.get_running_loop().create_task(publish(event, data), name=f"Publishing {event}")
+    except RuntimeError:
+        return
+    _TASKS.add(task)
+    task.add_done_callback(_TASKS.discard)
+    task.add_done_callback(log_task_failure)
+
+
+def _dispatch(_conn, _pid, _channel, payload: str) -> None:
+    try:
+        message = json.loads(payload)
+    except ValueError:
+        return
+    if message.get("worker") == WORKER_ID:
+        return
+    for handler in _HANDLERS.get(message.get("event"), []):
+        try:
+            result = handler(message.get("data"))
+            if asyncio.iscoroutine(result):
+                task = asyncio.create_task(result, name=f"Handler for {message.get('event')}")
+                _TASKS.add(task)
+                task.add_done_callback(_TASKS.discard)
+                task.add_done_callback(log_task_failure)
+        except Exception:
+            logger.exception("Handler for %s failed", message.get("event"))
+
+
+class Coordinator:
+    """
+    Keeps one dedicated connection LISTENing on CHANNEL so in-process
+    caches and state stay coherent across uvicorn workers without Redis.
+    Publishing goes through the regular `databases` pool (pg_notify).
+    The listener reconnects with backoff if the connection drops.
+    """
+
+    def __init__(self, dsn: str):
+        self.dsn = dsn
+        self._conn: Optional[asyncpg.Connection] = None
+        self._reconnect_task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    async def start(self) -> None:
+        self._stopping = False
+        await self._connect()
+
+    async def _connect(self) -> None:
+        self._conn = await asyncpg.connect(self.dsn)
+        self._conn.add_termination_listener(self._on_terminated)
+        await self._conn.add_listener(CHANNEL, _dispatch)
+
+    def _on_terminated(self, _conn) -> None:
+        if not self._stopping and (self._reconnect_task is None or self._reconnect_task.done()):
+            self._reconnect_task = asyncio.create_task(self._reconnect())
+
+    async def _reconnect(self) -> None:
+        delay = 1.0
+        while not self._stopping:
+            try:
+                await self._connect()
+                logger.warning("Reconnected to %s; events sent meanwhile were missed", CHANNEL)
+                return
+            except Exception as e:
+                logger.warning("Reconnecting to %s failed (%r), retrying in %.0fs", CHANNEL, e, delay)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30.0)
+
+    async def stop(self) -> None:
+        self._stopping = True
+        if self._reconnect_task is not None:
+            self._reconnect_task.cancel()
+        if self._conn is not None and not self._conn.is_closed():
+            await self._conn.close()
+
+
+coordinator = Coordinator(settings.DATABASE_URL.replace("+asyncpg", ""))
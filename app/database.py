@@ -1,11 +1,18 @@
+import time
 from databases import Database
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy import create_engine
 from pydantic import BaseSettings
+from app.metrics import DB_IN_FLIGHT, DB_POOL, DB_SECONDS
 
 
 class Settings(BaseSettings):
     DATABASE_URL: str
+    # the `databases` pool: broadcast jobs, file_ids, NOTIFY publishes and
+    # everything else not in app/queries.py (read here so alembic needs
+    # nothing but DATABASE_URL)
+    # (see the connection budget in app/config.py)
+    DB_POOL_MIN_SIZE: int = 1
+    DB_POOL_MAX_SIZE: int = 4
 
     class Config:
         env_file = ".env"
@@ -13,8 +20,48 @@ class Settings(BaseSettings):
 
 settings = Settings()
 
-database = Database(settings.DATABASE_URL, min_size=1, max_size=3)
-engine = create_engine(settings.DATABASE_URL.replace("+asyncpg", ""), echo=True)
+
+class TimedDatabase(Database):
+    """Database that records each call's latency by method name."""
+
+    async def _timed(self, call: str, coro):
+        DB_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            return await coro
+        finally:
+            DB_IN_FLIGHT.dec()
+            DB_SECONDS.observe(time.perf_counter() - start, call=call)
+
+    async def fetch_all(self, query, values=None):
+        return await self._timed("fetch_all", super().fetch_all(query, values))
+
+    async def fetch_one(self, query, values=None):
+        return await self._timed("fetch_one", super().fetch_one(query, values))
+
+    async def fetch_val(self, query, values=None, column=0):
+        return await self._timed("fetch_val", super().fetch_val(query, values, column))
+
+    async def execute(self, query, values=None):
+        return await self._timed("execute", super().execute(query, values))
+
+    async def execute_many(self, query, values):
+        return await self._timed("execute_many", super().execute_many(query, values))
+
+
+database = TimedDatabase(settings.DATABASE_URL, min_size=settings.DB_POOL_MIN_SIZE, max_size=settings.DB_POOL_MAX_SIZE)
+
+
+def _pool_connections() -> dict:
+    # the asyncpg pool behind `databases`; absent until connect()
+    pool = getattr(database._backend, "_pool", None)
+    if pool is None:
+        return {}
+    size, idle = pool.get_size(), pool.get_idle_size()
+    return {("busy",): size - idle, ("idle",): idle, ("max",): pool.get_max_size()}
+
+
+DB_POOL.set_function(_pool_connections)
 
 Base = declarative_base()
 metadata = Base.metadata
@@ -0,0 +1,123 @@
+# app/dedup.py
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Optional
+from app.database import database
+from app.metrics import UPDATES_DUPLICATE
+from app.queries import queries
+
+logger = logging.getLogger(__name__)
+
+
+class UpdateDeduplicator:
+    """
+    Lets each Telegram update_id through once. The last `window` ids are
+    remembered in memory; a delivery that arrives while the first one is
+    still being claimed waits for that claim instead of making its own.
+
+    With `durable`, ids are also claimed in Postgres (processed_updates) so
+    a redelivery that lands on another worker is dropped too. Claims made
+    within `batch_delay` of each other share one INSERT ... ON CONFLICT DO
+    NOTHING RETURNING, and rows older than `ttl` seconds are pruned (Telegram
+    stops redelivering long before that). If Postgres is unreachable the
+    update is let through: a rare duplicate beats a lost click.
+    """
+
+    def __init__(self, window: int, durable: bool, ttl: int, batch_delay: float = 0.005):
+        self.window = window
+        self.durable = durable
+        self.ttl = ttl
+        self.batch_delay = batch_delay
+        self._seen: OrderedDict[int, None] = OrderedDict()
+        self._inflight: dict[int, asyncio.Future] = {}
+        self._batch: dict[int, asyncio.Future] = {}
+        self._batch_task: Optional[asyncio.Task] = None
+        self._prune_task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self.durable:
+            self._prune_task = asyncio.create_task(self._prune_loop())
+
+    async def stop(self) -> None:
+        tasks = [t for t in (self._prune_task, self._batch_task) if t is not None]
+        if self._prune_task is not None:
+            self._prune_task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def claim(self, update_id: int) -> bool:
+        """True for the first delivery of `update_id`, False for a duplicate."""
+        if update_id in self._seen:
+            UPDATES_DUPLICATE.inc(source="memory")
+            return False
+        pending = self._inflight.get(update_id)
+        if pending is not None:
+            # the same update arrived twice at once; the first delivery wins
+            await asyncio.shield(pending)
+            UPDATES_DUPLICATE.inc(source="inflight")
+            return False
+
+        pending = self._inflight[update_id] = asyncio.get_running_loop().create_future()
+        try:
+            first = True
+            if self.durable:
+                try:
+                    first = await self._claim_in_db(update_id)
+                except Exception as e:
+                    logger.warning("Claiming update %s in Postgres failed, processing it anyway: %r", update_id, e)
+                if not first:
+                    UPDATES_DUPLICATE.inc(source="postgres")
+            self._remember(update_id)
+            return first
+        finally:
+            pending.set_result(None)
+            del self._inflight[update_id]
+
+    async def release(self, update_id: int) -> None:
+        """Forgets a claim whose update was not processed, so Telegram's retry gets through."""
+        self._seen.pop(update_id, None)
+        if self.durable:
+            await database.execute(
+                "DELETE FROM processed_updates WHERE update_id = :update_id", {"update_id": update_id}
+            )
+
+    def _remember(self, update_id: int) -> None:
+        self._seen[update_id] = None
+        while len(self._seen) > self.window:
+            self._seen.popitem(last=False)
+
+    def _claim_in_db(self, update_id: int) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        self._batch[update_id] = future
+        if self._batch_task is None or self._batch_task.done():
+            self._batch_task = asyncio.create_task(self._flush_batch())
+        return future
+
+    async def _flush_batch(self) -> None:
+        await asyncio.sleep(self.batch_delay)
+        batch, self._batch = self._batch, {}
+        # claims arriving during the INSERT start the next batch
+        self._batch_task = None
+        try:
+            rows = await queries.fetch("claim_updates", list(batch))
+        except Exception as e:
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+        claimed = {r["update_id"] for r in rows}
+        for update_id, future in batch.items():
+            # a waiter whose request was cancelled has nothing to resolve
+            if not future.done():
+                future.set_result(update_id in claimed)
+
+    async def _prune_loop(self) -> None:
+        while True:
+            try:
+                await database.execute(
+                    "DELETE FROM processed_updates WHERE received_at < now() - make_interval(secs => :ttl)",
+                    {"ttl": float(self.ttl)},
+                )
+            except Exception:
+                logger.exception("Pruning processed_updates failed")
+            await asyncio.sleep(600)
@@ -0,0 +1,72 @@
+# app/dispatcher.py
+import asyncio
+import logging
+from typing import Optional
+from telegram import Update
+from telegram.ext import Application
+
+logger = logging.getLogger(__name__)
+
+
+def _ordering_key(update: Update) -> int:
+    """Updates sharing this key are processed strictly in arrival order."""
+    if update.effective_chat is not None:
+        return update.effective_chat.id
+    if update.effective_user is not None:
+        return update.effective_user.id
+    return update.update_id
+
+
+class UpdateDispatcher:
+    """
+    Decouples the webhook from update processing. Each consumer task owns
+    a bounded queue and an update always goes to the queue picked by its
+    chat id, so one chat's updates run in order while different chats run
+    in parallel. `submit` waits at most `put_timeout` for room and then
+    reports the queue as full so the caller can push back on Telegram.
+    """
+
+    def __init__(self, application: Application, workers: int, queue_size: int, put_timeout: float):
+        self.application = application
+        self.put_timeout = put_timeout
+        per_worker = max(1, queue_size // workers)
+        self._queues = [asyncio.Queue(maxsize=per_worker) for _ in range(workers)]
+        self._tasks: list[asyncio.Task] = []
+
+    @property
+    def pending(self) -> int:
+        return sum(q.qsize() for q in self._queues)
+
+    def start(self) -> None:
+        self._tasks = [asyncio.create_task(self._consume(q)) for q in self._queues]
+
+    async def stop(self, timeout: Optional[float] = 10.0) -> None:
+        """Lets queued updates finish (up to `timeout`), then stops the consumers."""
+        try:
+            await asyncio.wait_for(asyncio.gather(*(q.join() for q in self._queues)), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Dropping %d queued updates on shutdown", self.pending)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def submit(self, update: Update) -> bool:
+        queue = self._queues[_ordering_key(update) % len(self._queues)]
+        try:
+            queue.put_nowait(update)
+        except asyncio.QueueFull:
+            try:
+                await asyncio.wait_for(queue.put(update), self.put_timeout)
+            except asyncio.TimeoutError:
+                return False
+        return True
+
+    async def _consume(self, queue: asyncio.Queue) -> None:
+        while True:
+            update = await queue.get()
+            try:
+                await self.application.process_update(update)
+            except Exception:
+                logger.exception("Exception while processing update %s", update.update_id)
+            finally:
+                queue.task_done()
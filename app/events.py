@@ -0,0 +1,217 @@
+# app/events.py
+import asyncio
+import logging
+import re
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional
+from app.batching import BatchWriter
+from app.config import settings
+from app.database import database
+from app.metrics import EVENTS
+from app.queries import queries
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = ["created_at", "kind", "chat_id", "lang", "slot", "rank", "value"]
+
+_PARTITION = re.compile(r"^events_(\d{8})$")
+
+
+class EventRecorder(BatchWriter):
+    """
+    Buffers engagement events and COPYs them into the partitioned `events`
+    table in batches. While Postgres is unreachable up to `max_buffer` are
+    kept and newer ones dropped. `screen()` also records a "dwell" event
+    with the seconds spent on the previous screen (up to `session_gap`).
+    """
+
+    def __init__(self, batch_size: int, flush_interval: float, max_buffer: int, session_gap: float):
+        super().__init__(flush_interval)
+        self.batch_size = batch_size
+        self.max_buffer = max_buffer
+        self.session_gap = session_gap
+        # chat_id -> (arrived at, lang, slot) of the screen each user is on
+        self._screens: OrderedDict[int, tuple[float, Optional[str], Optional[str]]] = OrderedDict()
+
+    def record(self, kind: str, chat_id: int = None, lang: str = None, slot: str = None,
+               rank: int = None, value: float = None) -> None:
+        if len(self._buffer) >= self.max_buffer:
+            EVENTS.inc(result="dropped")
+            return
+        self._buffer.append((datetime.now(timezone.utc), kind, chat_id, lang, slot, rank, value))
+        EVENTS.inc(result="recorded")
+        if len(self._buffer) >= self.batch_size:
+            self.flush_soon()
+
+    def screen(self, kind: str, chat_id: int, lang: str, slot: str = None, rank: int = None) -> None:
+        """Records `kind` for a user arriving on a menu (no `slot`) or a slot card."""
+        now = time.monotonic()
+        previous = self._screens.pop(chat_id, None)
+        if previous is not None and now - previous[0] <= self.session_gap:
+            self.record("dwell", chat_id, previous[1], previous[2], value=round(now - previous[0], 1))
+        self._screens[chat_id] = (now, lang, slot)
+        self.record(kind, chat_id, lang, slot, rank)
+
+    def _forget_idle(self) -> None:
+        # oldest arrivals first; anyone past the gap has left
+        cutoff = time.monotonic() - self.session_gap
+        while self._screens:
+            chat_id, (arrived, _, _) = next(iter(self._screens.items()))
+            if arrived > cutoff:
+                break
+            del self._screens[chat_id]
+
+    async def flush(self) -> None:
+        self._forget_idle()
+        await super().flush()
+
+    def _put_back(self, batch: list[tuple]) -> None:
+        # newest dropped past the cap
+        self._buffer = (batch + self._buffer)[:self.max_buffer]
+
+    async def _write(self, batch: list[tuple]) -> None:
+        await queries.copy("events", COLUMNS, batch)
+        EVENTS.inc(len(batch), result="written")
+
+
+def _day_start(day: date) -> str:
+    return f"{day.isoformat()} 00:00:00+00"
+
+
+async def ensure_partitions(today: date, ahead: int, retention_days: int) -> None:
+    """
+    Creates the daily partitions up to `ahead` days out and drops those past
+    retention. Call it inside a transaction: a day whose rows already landed
+    in events_default (the rollup fell behind) has them moved into the new
+    partition before it is attached, which Postgres would refuse otherwise.
+    """
+    for offset in range(ahead + 1):
+        day = today + timedelta(days=offset)
+        name = f"events_{day:%Y%m%d}"
+        if await database.fetch_val(f"SELECT to_regclass('{name}') IS NOT NULL"):
+            continue
+        start, end = _day_start(day), _day_start(day + timedelta(days=1))
+        await database.execute(f"CREATE TABLE {name} (LIKE events INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+        moved = await database.fetch_val(
+            f"""
+            WITH moved AS (
+                DELETE FROM events_default WHERE created_at >= '{start}' AND created_at < '{end}' RETURNING *
+            )
+            INSERT INTO {name} SELECT * FROM moved RETURNING 1
+            """
+        )
+        if moved:
+            logger.warning("Moved %s events out of events_default", day.isoformat())
+        await database.execute(f"ALTER TABLE events ATTACH PARTITION {name} FOR VALUES FROM ('{start}') TO ('{end}')")
+    rows = await database.fetch_all(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = 'events'"
+    )
+    oldest = today - timedelta(days=retention_days)
+    for row in rows:
+        match = _PARTITION.match(row["relname"])
+        if match and datetime.strptime(match.group(1), "%Y%m%d").date() < oldest:
+            await database.execute(f"DROP TABLE {row['relname']}")
+            logger.info("Dropped event partition %s", row["relname"])
+
+
+async def rollup() -> None:
+    """
+    Rebuilds yesterday's and today's rows of event_daily from the raw
+    events (yesterday again because events buffered at midnight land late).
+    """
+    await database.execute(
+        """
+        INSERT INTO event_daily (day, kind, lang, slot, events, users, value)
+        SELECT (created_at AT TIME ZONE 'UTC')::date, kind, coalesce(lang, ''), coalesce(slot, ''),
+               count(*), count(DISTINCT chat_id), coalesce(sum(value), 0)
+        FROM events
+        WHERE created_at >= (date_trunc('day', now() AT TIME ZONE 'UTC') - interval '1 day') AT TIME ZONE 'UTC'
+        GROUP BY 1, 2, 3, 4
+        ON CONFLICT (day, kind, lang, slot) DO UPDATE
+        SET events = EXCLUDED.events, users = EXCLUDED.users, value = EXCLUDED.value
+        """
+    )
+
+
+class EventRollup:
+    """
+    Every `interval` seconds, one worker (whichever takes the advisory
+    lock) maintains the event partitions and refreshes the daily rollups.
+    """
+
+    def __init__(self, interval: float, retention_days: int, partitions_ahead: int = 3):
+        self.interval = interval
+        self.retention_days = retention_days
+        self.partitions_ahead = partitions_ahead
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    async def run_once(self) -> bool:
+        """False if another worker is already at it."""
+        async with database.transaction():
+            if not await database.fetch_val("SELECT pg_try_advisory_xact_lock(hashtext('events.rollup'))"):
+                return False
+            await ensure_partitions(datetime.now(timezone.utc).date(), self.partitions_ahead, self.retention_days)
+            await rollup()
+        return True
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except Exception:
+                logger.exception("Event rollup failed")
+            await asyncio.sleep(self.interval)
+
+
+async def engagement_report(days: int) -> dict[str, list]:
+    """Per-slot and per-language totals over the last `days` days, from event_daily only."""
+    values = {"days": days}
+    slots = await database.fetch_all(
+        """
+        SELECT lang, slot,
+               sum(events) FILTER (WHERE kind = 'open_slot') AS opens,
+               sum(events) FILTER (WHERE kind = 'play') AS plays,
+               sum(value) FILTER (WHERE kind = 'dwell') / nullif(sum(events) FILTER (WHERE kind = 'dwell'), 0)
+                   AS avg_seconds
+        FROM event_daily
+        WHERE day > (now() AT TIME ZONE 'UTC')::date - :days AND slot <> ''
+        GROUP BY lang, slot
+        ORDER BY opens DESC NULLS LAST
+        """,
+        values,
+    )
+    langs = await database.fetch_all(
+        """
+        SELECT lang,
+               sum(events) FILTER (WHERE kind = 'open_menu') AS menu_opens,
+               sum(events) FILTER (WHERE kind = 'open_slot') AS slot_opens,
+               sum(value) FILTER (WHERE kind = 'dwell' AND slot = '')
+                   / nullif(sum(events) FILTER (WHERE kind = 'dwell' AND slot = ''), 0) AS avg_menu_seconds
+        FROM event_daily
+        WHERE day > (now() AT TIME ZONE 'UTC')::date - :days AND lang <> ''
+        GROUP BY lang
+        ORDER BY menu_opens DESC NULLS LAST
+        """,
+        values,
+    )
+    return {"slots": slots, "langs": langs}
+
+
+events = EventRecorder(
+    batch_size=settings.EVENT_BATCH_SIZE,
+    flush_interval=settings.EVENT_FLUSH_INTERVAL,
+    max_buffer=settings.EVENT_BUFFER_MAX,
+    session_gap=settings.EVENT_SESSION_GAP,
+)
@@ -0,0 +1,101 @@
+# app/file_ids.py
+import asyncio
+from collections import OrderedDict
+from typing import Optional
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+from app.batching import log_task_failure
+from app.config import settings
+from app.coordination import notify, subscribe
+from app.database import database
+from app.metrics import cache_lookup
+from app.models import TelegramFileId
+
+
+class FileIdCache:
+    """
+    Maps a Spaces image (URL + ETag) to the file_id Telegram assigned when
+    it was first sent, so later sends reference the file instead of making
+    Telegram download it from the CDN again.
+
+    Entries live in a bounded LRU in memory and are written through to the
+    telegram_file_ids table, which is read back at startup. Re-uploading
+    an image changes its ETag, so the old file_id is never served for it.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: OrderedDict[str, tuple[str, str]] = OrderedDict()  # url -> (etag, file_id)
+        self._tasks: set[asyncio.Task] = set()
+
+    async def warm(self) -> None:
+        # rows for images nobody has opened in a month are dead weight
+        await database.execute(
+            "DELETE FROM telegram_file_ids WHERE updated_at < now() - interval '30 days'"
+        )
+        rows = await database.fetch_all(
+            "SELECT url, etag, file_id FROM telegram_file_ids ORDER BY updated_at DESC LIMIT :limit",
+            {"limit": self.max_size},
+        )
+        # oldest first, so the most recent end up at the MRU end
+        for row in reversed(rows):
+            self._entries[row["url"]] = (row["etag"], row["file_id"])
+
+    def get(self, url: str, etag: str) -> Optional[str]:
+        entry = self._entries.get(url)
+        if entry is None:
+            cache_lookup("file_id", "miss")
+            return None
+        if entry[0] != etag:
+            # the object was replaced in Spaces
+            del self._entries[url]
+            cache_lookup("file_id", "miss")
+            return None
+        self._entries.move_to_end(url)
+        cache_lookup("file_id", "hit")
+        return entry[1]
+
+    def _store(self, url: str, etag: str, file_id: str) -> None:
+        self._entries[url] = (etag, file_id)
+        self._entries.move_to_end(url)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def put(self, url: str, etag: str, file_id: str) -> None:
+        if self._entries.get(url) == (etag, file_id):
+            return
+        self._store(url, etag, file_id)
+        self._spawn(self._save(url, etag, file_id))
+        notify("file_id.put", {"url": url, "etag": etag, "file_id": file_id})
+
+    def _discard(self, url: str) -> None:
+        self._entries.pop(url, None)
+
+    def forget(self, url: str) -> None:
+        """Drops a file_id Telegram no longer accepts."""
+        self._discard(url)
+        self._spawn(database.execute(
+            "DELETE FROM telegram_file_ids WHERE url = :url", {"url": url}
+        ))
+        notify("file_id.forget", {"url": url})
+
+    def _spawn(self, coro) -> None:
+        task = asyncio.create_task(coro, name="Writing the file_id cache")
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        task.add_done_callback(log_task_failure)
+
+    async def _save(self, url: str, etag: str, file_id: str) -> None:
+        stmt = insert(TelegramFileId).values(url=url, etag=etag, file_id=file_id)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['url'],
+            set_={"etag": stmt.excluded.etag, "file_id": stmt.excluded.file_id, "updated_at": func.now()},
+        )
+        await database.execute(stmt)
+
+
+file_id_cache = FileIdCache(max_size=settings.FILE_ID_CACHE_SIZE)
+
+# other workers already stored these; only our in-memory copy needs them
+subscribe("file_id.put", lambda data: file_id_cache._store(data["url"], data["etag"], data["file_id"]))
+subscribe("file_id.forget", lambda data: file_id_cache._discard(data["url"]))
@@ -0,0 +1,218 @@
+# app/images.py
+"""
+Makes Telegram-sized copies of a day's slot images and uploads them next
+to the originals as `<key>.tg.jpg` (see spaces_client.variant_key), which
+the bot then sends instead. Each copy is resized to IMAGE_MAX_SIDE on its
+longest side and re-encoded as a progressive JPEG. Its metadata records
+the original's ETag and the settings it was made with, so re-running
+skips every image that has not changed.
+
+    python -m app.images                       # every language, today
+    python -m app.images --lang AZ --date 20261018 --report report.json
+    python -m app.images --dry-run --measure   # sizes and CDN fetch times only
+
+Needs Pillow (`pip install Pillow`), which the bot itself does not.
+"""
+import argparse
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from datetime import date
+from io import BytesIO
+from typing import Optional
+from botocore.exceptions import ClientError
+from app.config import settings
+from app.languages import LANGUAGES
+from app.spaces_client import VARIANT_SUFFIX, _client, _iter_objects, variant_key
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# Telegram's sendPhoto limits
+MAX_PHOTO_BYTES = 10 * 1024 * 1024
+MAX_DIMENSIONS_SUM = 10000
+MAX_ASPECT_RATIO = 20
+
+
+def available() -> bool:
+    return Image is not None
+
+
+def _params(max_side: int, quality: int) -> str:
+    # part of the skip check: new settings mean new copies
+    return f"jpeg-q{quality}-max{max_side}"
+
+
+@dataclass
+class Result:
+    key: str
+    status: str  # created, unchanged, kept_original, failed (or would_create with --dry-run)
+    source_bytes: int = 0
+    variant_bytes: int = 0
+    process_ms: float = 0.0
+    upload_ms: float = 0.0
+    source_fetch_ms: Optional[float] = None
+    variant_fetch_ms: Optional[float] = None
+    error: Optional[str] = None
+
+
+def optimize(data: bytes, max_side: int, quality: int) -> bytes:
+    """The image as a JPEG no larger than `max_side` on either side; transparency becomes white."""
+    image = Image.open(BytesIO(data))
+    image.load()
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A"))
+        image = background
+    elif image.mode != "RGB":
+        image = image.convert("RGB")
+    image.thumbnail((max_side, max_side), Image.LANCZOS)
+    width, height = image.size
+    if width + height > MAX_DIMENSIONS_SUM or max(width, height) / min(width, height) > MAX_ASPECT_RATIO:
+        raise ValueError(f"{width}x{height} is outside Telegram's photo limits")
+    out = BytesIO()
+    image.save(out, "JPEG", quality=quality, optimize=True, progressive=True)
+    return out.getvalue()
+
+
+def source_objects(lang: str, stamp: str) -> list[dict]:
+    """The day's originals in either key layout (see spaces_client._list_for_stamp)."""
+    objects = [o for o in _iter_objects(f"{lang}/{stamp}/") if o["Key"].endswith((".png", ".jpg"))]
+    if not objects:
+        objects = [
+            o for o in _iter_objects(f"{lang}/", delimiter="/")
+            if o["Key"].endswith((f"_{stamp}.png", f"_{stamp}.jpg"))
+        ]
+    return [o for o in objects if not o["Key"].endswith(VARIANT_SUFFIX)]
+
+
+def _head(key: str) -> Optional[dict]:
+    try:
+        return _client().head_object(Bucket=settings.SPACES_NAME, Key=key)
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+            return None
+        raise
+
+
+def _timed_fetch(url: str) -> float:
+    import httpx
+
+    start = time.perf_counter()
+    httpx.get(url, timeout=30).raise_for_status()
+    return (time.perf_counter() - start) * 1000
+
+
+def process(obj: dict, max_side: int, quality: int, force: bool = False, dry_run: bool = False,
+            measure: bool = False) -> Result:
+    key, params = obj["Key"], _params(max_side, quality)
+    source_etag = obj.get("ETag", "").strip('"')
+    target = variant_key(key)
+    result = Result(key, "created", source_bytes=obj.get("Size", 0))
+    try:
+        existing = _head(target)
+        meta = existing["Metadata"] if existing else {}
+        if not force and meta.get("source-etag") == source_etag and meta.get("params") == params:
+            result.status = "unchanged"
+            result.variant_bytes = existing["ContentLength"]
+        else:
+            start = time.perf_counter()
+            data = _client().get_object(Bucket=settings.SPACES_NAME, Key=key)["Body"].read()
+            variant = optimize(data, max_side, quality)
+            result.process_ms = (time.perf_counter() - start) * 1000
+            result.source_bytes, result.variant_bytes = len(data), len(variant)
+            if len(variant) >= len(data) or len(variant) > MAX_PHOTO_BYTES:
+                # the original is already the better photo
+                result.status = "kept_original"
+                if existing and not dry_run:
+                    _client().delete_object(Bucket=settings.SPACES_NAME, Key=target)
+            elif dry_run:
+                result.status = "would_create"
+            else:
+                start = time.perf_counter()
+                _client().put_object(
+                    Bucket=settings.SPACES_NAME, Key=target, Body=variant, ACL="public-read",
+                    ContentType="image/jpeg", CacheControl="public, max-age=86400",
+                    Metadata={"source-etag": source_etag, "params": params},
+                )
+                result.upload_ms = (time.perf_counter() - start) * 1000
+        if measure:
+            # what Telegram's fetch from the CDN costs, before and after
+            result.source_fetch_ms = _timed_fetch(f"{settings.cdn_base}/{key}")
+            if result.status in ("created", "unchanged"):
+                result.variant_fetch_ms = _timed_fetch(f"{settings.cdn_base}/{target}")
+    except Exception as e:
+        result.status, result.error = "failed", repr(e)
+    return result
+
+
+def optimize_day(lang: str, stamp: str, max_side: int = None, quality: int = None, force: bool = False,
+                 dry_run: bool = False, measure: bool = False, jobs: int = 4) -> list[Result]:
+    """Processes one language's images for `stamp` (blocking; a few images at a time)."""
+    max_side = max_side or settings.IMAGE_MAX_SIDE
+    quality = quality or settings.IMAGE_QUALITY
+    objects = source_objects(lang, stamp)
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        return list(pool.map(lambda obj: process(obj, max_side, quality, force, dry_run, measure), objects))
+
+
+def _median(values: list[float]) -> Optional[float]:
+    values = sorted(v for v in values if v is not None)
+    return values[len(values) // 2] if values else None
+
+
+def summarize(results: list[Result]) -> dict:
+    served = [r for r in results if r.status in ("created", "unchanged", "would_create")]
+    source, variant = sum(r.source_bytes for r in served), sum(r.variant_bytes for r in served)
+    return {
+        "images": len(results),
+        "by_status": {s: sum(1 for r in results if r.status == s) for s in sorted({r.status for r in results})},
+        "source_bytes": source,
+        "variant_bytes": variant,
+        "saved_pct": round(100 * (1 - variant / source), 1) if source else 0.0,
+        "process_ms_p50": _median([r.process_ms for r in results if r.process_ms]),
+        "source_fetch_ms_p50": _median([r.source_fetch_ms for r in served]),
+        "variant_fetch_ms_p50": _median([r.variant_fetch_ms for r in served]),
+    }
+
+
+def main(argv=None) -> None:
+    p = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    p.add_argument("--lang", action="append", choices=sorted(LANGUAGES), help="language (repeatable; default all)")
+    p.add_argument("--date", default=date.today().strftime("%Y%m%d"), help="image date, YYYYMMDD (default today)")
+    p.add_argument("--max-side", type=int, default=settings.IMAGE_MAX_SIDE)
+    p.add_argument("--quality", type=int, default=settings.IMAGE_QUALITY)
+    p.add_argument("--force", action="store_true", help="remake copies even if unchanged")
+    p.add_argument("--dry-run", action="store_true", help="report sizes without uploading")
+    p.add_argument("--measure", action="store_true", help="time CDN downloads of originals and copies")
+    p.add_argument("--jobs", type=int, default=4, help="images processed at once")
+    p.add_argument("--report", help="write the per-image results and totals to this JSON file")
+    args = p.parse_args(argv)
+    if not available():
+        p.error("Pillow is required: pip install Pillow")
+
+    report = {"date": args.date, "params": _params(args.max_side, args.quality), "languages": {}}
+    for lang in args.lang or list(LANGUAGES):
+        results = optimize_day(lang, args.date, args.max_side, args.quality, args.force, args.dry_run,
+                               args.measure, args.jobs)
+        totals = summarize(results)
+        report["languages"][lang] = {"totals": totals, "images": [asdict(r) for r in results]}
+        for r in results:
+            line = f"  {r.status:<14} {r.key}: {r.source_bytes / 1024:.0f} KB -> {r.variant_bytes / 1024:.0f} KB"
+            if r.variant_fetch_ms is not None:
+                line += f", fetch {r.source_fetch_ms:.0f} -> {r.variant_fetch_ms:.0f} ms"
+            print(line + (f" ({r.error})" if r.error else ""))
+        print(f"{lang}: {totals['images']} images {totals['by_status']}, "
+              f"{totals['source_bytes'] / 1024:.0f} KB -> {totals['variant_bytes'] / 1024:.0f} KB "
+              f"({totals['saved_pct']}% smaller)", flush=True)
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2, default=str)
+
+
+if __name__ == "__main__":
+    main()
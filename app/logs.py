@@ -0,0 +1,90 @@
+# app/logs.py
+"""
+Structured logging. Records are rendered as one JSON object per line by a
+QueueListener thread, so a log call on the event loop only builds the
+record and enqueues it. Hot-path events go through `log_event`, which
+checks the level and the event's sample rate before any record exists.
+"""
+import atexit
+import json
+import logging
+import queue
+import random
+import sys
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+# attributes every LogRecord has; anything else came in through `extra`
+_STANDARD = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "taskName"}
+
+_SAMPLE_RATES: dict[str, float] = {}
+_LISTENER: Optional[QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _DeferredQueueHandler(QueueHandler):
+    # the default prepare() formats the message on the caller's thread; the
+    # listener's formatter does that instead
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def _pairs(spec: str) -> dict[str, str]:
+    """ "a=1,b=2" -> {"a": "1", "b": "2"} """
+    return dict(item.split("=", 1) for item in (s.strip() for s in spec.split(",")) if item)
+
+
+def setup_logging(level: str = "INFO", levels: str = "", sample: str = "") -> None:
+    """
+    Routes the root logger through a background JSON writer on stdout.
+    `levels` sets per-logger levels ("httpx=WARNING,app.broadcast=DEBUG"),
+    `sample` per-event sample rates ("webhook.update=0.01").
+    """
+    global _LISTENER
+    if _LISTENER is not None:
+        _LISTENER.stop()
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter())
+    _LISTENER = QueueListener(records, output, respect_handler_level=True)
+    _LISTENER.start()
+    atexit.register(_LISTENER.stop)
+
+    root = logging.getLogger()
+    root.handlers = [_DeferredQueueHandler(records)]
+    root.setLevel(level.upper())
+    for name, logger_level in _pairs(levels).items():
+        logging.getLogger(name).setLevel(logger_level.upper())
+    _SAMPLE_RATES.clear()
+    _SAMPLE_RATES.update({event: float(rate) for event, rate in _pairs(sample).items()})
+
+
+def log_event(logger: logging.Logger, event: str, level: int = logging.INFO, **fields) -> None:
+    """
+    Logs `event` with `fields` as structured data, keeping only the share
+    of calls set by the event's sample rate (all of them by default).
+    """
+    if not logger.isEnabledFor(level):
+        return
+    rate = _SAMPLE_RATES.get(event, 1.0)
+    if rate < 1.0 and random.random() >= rate:
+        return
+    if rate < 1.0:
+        fields["sample_rate"] = rate
+    logger.log(level, event, extra={"event": event, **fields})
@@ -1,31 +1,136 @@
 import asyncio
+import hashlib
+import hmac
+import logging
+import re
+from datetime import timedelta
 from telegram import Update
 from fastapi import FastAPI, Request, Response
-from app.bot import create_bot, settings
+from fastapi.responses import RedirectResponse
+from app.bot import create_bot, resume_broadcasts, settings
+from app.capture import Scrubber, UpdateCapture
+from app.coordination import coordinator
 from app.database import database
+from app.dedup import UpdateDeduplicator
+from app.dispatcher import UpdateDispatcher
+from app.events import EventRollup, events
+from app.file_ids import file_id_cache
+from app.logs import log_event, setup_logging
+from app.metrics import UPDATE_QUEUE, render
+from app.prewarm import Prewarmer
+from app.queries import queries
+from app.ranking import cached_ranking, play_signature
+from app.registrar import registrar
+from app.spaces_client import load_play_url, play_url_object, watch_objects
+from app.transport import bulk_bot
+
+setup_logging(settings.LOG_LEVEL, settings.LOG_LEVELS, settings.LOG_SAMPLE)
+logger = logging.getLogger(__name__)
 
 app = FastAPI()
 bot = create_bot()
+dispatcher = UpdateDispatcher(
+    bot,
+    workers=settings.UPDATE_WORKERS,
+    queue_size=settings.UPDATE_QUEUE_SIZE,
+    put_timeout=settings.UPDATE_QUEUE_TIMEOUT,
+)
+UPDATE_QUEUE.set_function(lambda: {(): dispatcher.pending})
+deduplicator = UpdateDeduplicator(
+    window=settings.DEDUP_WINDOW, durable=settings.DEDUP_DURABLE, ttl=settings.DEDUP_TTL,
+)
+capture = UpdateCapture(
+    settings.CAPTURE_DIR,
+    max_bytes=settings.CAPTURE_MAX_MB * 1024 * 1024,
+    keep=settings.CAPTURE_FILES,
+    # keyed by the token so every worker pseudonymises a user the same way
+    scrubber=Scrubber(hashlib.sha256(settings.TELEGRAM_TOKEN.encode()).digest()) if settings.CAPTURE_SCRUB_PII else None,
+) if settings.CAPTURE_DIR else None
+rollup = EventRollup(interval=settings.EVENT_ROLLUP_INTERVAL, retention_days=settings.EVENT_RETENTION_DAYS)
+prewarmer = Prewarmer(
+    bot.bot,
+    interval=settings.PREWARM_INTERVAL,
+    lead=timedelta(hours=settings.PREWARM_LEAD_HOURS),
+)
+
+
+async def ensure_webhook() -> None:
+    """
+    Points Telegram at WEBHOOK_URL unless it already is. On a redeploy the
+    webhook is normally unchanged, so no instance touches it and none can
+    undo another's registration.
+    """
+    info = await bot.bot.get_webhook_info()
+    if info.url == settings.WEBHOOK_URL:
+        logger.info("Webhook already set", extra={"url": info.url, "pending_update_count": info.pending_update_count})
+        return
+    await bot.bot.set_webhook(url=settings.WEBHOOK_URL)
+    logger.info("Webhook set", extra={"url": settings.WEBHOOK_URL, "previous_url": info.url or None})
+
+
+async def start_bots() -> None:
+    await bot.initialize()
+    # start() runs the periodic persistence writes; updates still come in via the webhook
+    await bot.start()
+    await bulk_bot().initialize()
+    await ensure_webhook()
 
 
 @app.on_event("startup")
 async def startup():
-    # Connect database
-    await database.connect()
+    # Connect database: the prepared-statement pool for per-update queries,
+    # `databases` for the rest
+    await asyncio.gather(database.connect(), queries.start())
 
-    # Initialize bot and set webhook
-    await bot.initialize()
-    await bot.bot.set_webhook(url=settings.WEBHOOK_URL)
+    # Listen for cache invalidations and shared state from other workers
+    await coordinator.start()
 
-    # Optional: print webhook info for debugging
-    info = await bot.bot.get_webhook_info()
-    print("DEBUG: Webhook info:", info)
+    # Independent of each other, so they run side by side: load known users
+    # (repeat /start needs no query), file_ids of images Telegram already
+    # has and the play URL (so handlers never fetch it), and initialize the
+    # bots and the webhook. Requests are only served once startup returns;
+    # until then Telegram keeps updates queued.
+    await asyncio.gather(
+        registrar.warm(), file_id_cache.warm(), play_url_object().refresh(), start_bots(),
+    )
+    registrar.start()
+    events.start()
+    rollup.start()
+    deduplicator.start()
+    dispatcher.start()
+
+    # Continue any broadcast a previous instance left unfinished
+    await resume_broadcasts(bot.bot)
+
+    # Revalidate metadata.json and play_url.txt in the background
+    app.state.watcher = asyncio.create_task(watch_objects(settings.REVALIDATE_INTERVAL))
+
+    # Keep catalogs and photo file_ids ready ahead of traffic and midnight
+    prewarmer.start()
+
+    if capture is not None:
+        capture.start()
 
 
 @app.on_event("shutdown")
 async def shutdown():
-    await bot.bot.delete_webhook()
+    # The webhook stays registered: during a rolling deploy the next
+    # instance is already serving it, and with none up Telegram holds the
+    # updates until one is. Updates accepted here are finished first.
+    await dispatcher.stop()
+    await deduplicator.stop()
+    if capture is not None:
+        await capture.stop()
+    await prewarmer.stop()
+    app.state.watcher.cancel()
+    await bot.stop()
     await bot.shutdown()
+    await bulk_bot().shutdown()
+    await rollup.stop()
+    await events.stop()
+    await registrar.stop()
+    await coordinator.stop()
+    await queries.stop()
     await database.disconnect()
 
 
@@ -40,15 +145,59 @@ async def health() -> dict:
     return {"ok": True}
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics() -> Response:
+    return Response(render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+# link previews and crawlers that follow a shared play link
+_CRAWLER = re.compile(r"bot|crawl|spider|preview|facebookexternalhit|slurp", re.IGNORECASE)
+
+
+@app.get("/go/play/{lang}/{slot}", include_in_schema=False)
+async def go_play(lang: str, slot: str, request: Request, sig: str = "") -> Response:
+    # the slot card's play button; counts the click, then on to the site.
+    # Only links the bot signed, for slots in the current ranking, from
+    # something that is not a crawler are counted; anything else just redirects.
+    ranking = cached_ranking(lang)
+    if (
+        ranking is not None and slot in ranking.slots
+        and hmac.compare_digest(sig, play_signature(lang, slot))
+        and not _CRAWLER.search(request.headers.get("user-agent", ""))
+    ):
+        events.record("play", lang=lang, slot=slot)
+    return RedirectResponse(load_play_url(), status_code=302)
+
+
 @app.post("/webhook")
 async def telegram_webhook(request: Request):
     update_json = await request.json()
+    if capture is not None:
+        capture.record(update_json)
     # Convert the JSON payload to a proper Update object
-    print("DEBUG: Received update JSON:", update_json)  # Log the raw JSON
     try:
         update = Update.de_json(update_json, bot.bot)
-        print("DEBUG: Parsed update:", update)  # Log the parsed Update object
-        await bot.process_update(update)
     except Exception as e:
-        print("DEBUG: Exception in processing update:", e)
+        log_event(logger, "webhook.bad_update", logging.WARNING, error=repr(e), payload=update_json)
+        return Response(status_code=200)
+    chat_id = update.effective_chat.id if update.effective_chat else None
+    if chat_id is not None and chat_id == settings.LOG_DEBUG_CHAT_ID:
+        log_event(logger, "webhook.payload", update_id=update.update_id, chat_id=chat_id, payload=update_json)
+    else:
+        log_event(logger, "webhook.update", update_id=update.update_id, chat_id=chat_id)
+
+    # Telegram redelivers when the webhook is slow; handle each update once
+    if not await deduplicator.claim(update.update_id):
+        log_event(logger, "webhook.duplicate", update_id=update.update_id, chat_id=chat_id)
+        return Response(status_code=200)
+
+    # Queue it and acknowledge right away; consumers process it in order per chat
+    if not await dispatcher.submit(update):
+        if settings.UPDATE_SHED_WHEN_FULL:
+            log_event(logger, "webhook.shed", logging.WARNING, update_id=update.update_id, chat_id=chat_id)
+            return Response(status_code=200)
+        # Telegram redelivers on non-2xx, so this pushes the burst back to
+        # it; the redelivery must not be mistaken for a duplicate
+        await deduplicator.release(update.update_id)
+        return Response(status_code=503)
     return Response(status_code=200)
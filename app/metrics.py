@@ -0,0 +1,215 @@
+# app/metrics.py
+"""
+Minimal Prometheus instrumentation: counters, gauges and histograms with
+labels, rendered in the text exposition format by `render()` for the
+/metrics endpoint. Metrics are updated from boto3 worker threads too, so
+every update takes a lock.
+"""
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_LOCK = threading.Lock()
+_REGISTRY: list["_Metric"] = []
+
+
+def _labels(names, values, extra: dict = None) -> str:
+    pairs = list(zip(names, values)) + list((extra or {}).items())
+    if not pairs:
+        return ""
+    body = ",".join(
+        '{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in pairs
+    )
+    return "{" + body + "}"
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        _REGISTRY.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(n, "") for n in self.labelnames)
+
+    def _samples(self) -> list[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        super().__init__(name, help, labelnames)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with _LOCK:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self) -> list[str]:
+        with _LOCK:
+            items = list(self._values.items())
+        return [f"{self.name}{_labels(self.labelnames, k)} {_number(v)}" for k, v in items]
+
+
+class Gauge(_Metric):
+    """A value that is set directly, or read from `set_function` at scrape time."""
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        super().__init__(name, help, labelnames)
+        self._values: dict[tuple, float] = {}
+        self._function: Callable[[], dict] = None
+
+    def set(self, value: float, **labels) -> None:
+        with _LOCK:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with _LOCK:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set_function(self, function: Callable[[], dict]) -> None:
+        """`function()` returns {label-values tuple: value}; () for no labels."""
+        self._function = function
+
+    def _samples(self) -> list[str]:
+        if self._function is not None:
+            try:
+                items = list(self._function().items())
+            except Exception:
+                items = []
+        else:
+            with _LOCK:
+                items = list(self._values.items())
+        return [f"{self.name}{_labels(self.labelnames, k)} {_number(v)}" for k, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets) + (float("inf"),)
+        self._series: dict[tuple, list] = {}  # key -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with _LOCK:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self) -> list[str]:
+        with _LOCK:
+            items = [(k, list(v)) for k, v in self._series.items()]
+        lines = []
+        for key, series in items:
+            for bound, count in zip(self.buckets, series):
+                le = _labels(self.labelnames, key, {"le": _number(bound)})
+                lines.append(f"{self.name}_bucket{le} {count}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(series[-2])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {series[-1]}")
+        return lines
+
+
+def render() -> str:
+    return "\n".join(metric.render() for metric in _REGISTRY) + "\n"
+
+
+HANDLER_SECONDS = Histogram("bot_handler_seconds", "Update handler latency.", ("handler",))
+HANDLER_ERRORS = Counter("bot_handler_errors_total", "Update handlers that raised.", ("handler",))
+S3_SECONDS = Histogram("spaces_request_seconds", "Spaces (S3) API call latency.", ("operation",))
+DB_SECONDS = Histogram("db_query_seconds", "Database call latency.", ("call",))
+DB_IN_FLIGHT = Gauge("db_queries_in_flight", "Database calls currently running.")
+DB_POOL = Gauge("db_pool_connections", "Database pool connections by state.", ("state",))
+PG_POOL = Gauge("pg_pool_connections", "Prepared-statement pool connections by state.", ("state",))
+PG_POOL_WAIT = Histogram(
+    "pg_pool_wait_seconds", "Time spent waiting for a free pool connection.",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0),
+)
+BOT_API_SECONDS = Histogram("telegram_api_seconds", "Bot API request latency.", ("pool", "method"))
+CACHE_REQUESTS = Counter("cache_requests_total", "Cache lookups.", ("cache", "result"))
+CACHE_HIT_RATIO = Gauge("cache_hit_ratio", "Share of cache lookups served from memory.", ("cache",))
+BROADCAST_MESSAGES = Counter("broadcast_messages_total", "Broadcast deliveries.", ("result",))
+BROADCAST_RATE = Gauge("broadcast_send_rate", "Messages per second of the running broadcast.")
+UPDATE_QUEUE = Gauge("update_queue_pending", "Updates waiting for a consumer.")
+UPDATES_DUPLICATE = Counter("updates_duplicate_total", "Redelivered updates dropped, by where they were caught.", ("source",))
+EVENTS = Counter("events_total", "Engagement events by outcome.", ("result",))
+
+
+def _hit_ratios() -> dict:
+    totals: dict[str, list] = {}
+    with _LOCK:
+        for (cache, result), count in CACHE_REQUESTS._values.items():
+            hits_total = totals.setdefault(cache, [0, 0])
+            hits_total[1] += count
+            if result != "miss":
+                hits_total[0] += count
+    return {(cache,): hits / total for cache, (hits, total) in totals.items() if total}
+
+
+CACHE_HIT_RATIO.set_function(_hit_ratios)
+
+
+def cache_lookup(cache: str, result: str) -> None:
+    """result is "hit", "miss" or "stale" (served, but being refreshed)."""
+    CACHE_REQUESTS.inc(cache=cache, result=result)
+
+
+def timed_handler(name: str):
+    """Records an update handler's latency and failures under `name`."""
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def wrapper(update, context):
+            start = time.perf_counter()
+            try:
+                return await handler(update, context)
+            except Exception:
+                HANDLER_ERRORS.inc(handler=name)
+                raise
+            finally:
+                HANDLER_SECONDS.observe(time.perf_counter() - start, handler=name)
+        return wrapper
+    return decorator
@@ -1,4 +1,7 @@
-from sqlalchemy import BigInteger, Column, Integer, String, DateTime, func
+from sqlalchemy import (
+    BigInteger, Boolean, Column, Date, DateTime, Float, ForeignKey, Index, Integer, JSON, SmallInteger, String,
+    Table, Text, func, text,
+)
 from .database import Base
 
 
@@ -9,3 +12,103 @@ class User(Base):
     chat_id = Column(BigInteger, unique=True, index=True)
     username = Column(String, index=True, nullable=True)
     subscribe_date = Column(DateTime(timezone=True), server_default=func.now())
+    # language picked in the bot menu (context.user_data['lang'])
+    lang = Column(String, nullable=True, index=True)
+    # last update from the user, at LAST_SEEN_RESOLUTION granularity
+    last_seen = Column(DateTime(timezone=True), nullable=True, index=True)
+    # false once Telegram says the chat is unreachable (blocked, deleted);
+    # the next update from the user sets it back
+    is_active = Column(Boolean, nullable=False, server_default=text('true'), index=True)
+
+    __table_args__ = (
+        # broadcasts page through active users in chat_id order
+        Index('ix_users_active_chat_id', 'chat_id', postgresql_where=text('is_active')),
+    )
+
+
+class BroadcastJob(Base):
+    __tablename__ = 'broadcast_jobs'
+
+    id = Column(Integer, primary_key=True, index=True)
+    admin_id = Column(BigInteger, nullable=False)
+    type = Column(String, nullable=False)
+    text = Column(Text, nullable=True)
+    file_id = Column(String, nullable=True)
+    caption = Column(Text, nullable=True)
+    reply_markup = Column(JSON, nullable=True)
+    # who gets it: {"lang": "AZ", "days": 7}; empty means every active user
+    segment = Column(JSON, nullable=True)
+    # draft (being composed; dropped once older than BROADCAST_DRAFT_TTL)
+    # -> running -> done
+    status = Column(String, nullable=False, server_default='pending', index=True)
+    # highest chat_id already claimed; a resumed job continues after it
+    cursor = Column(BigInteger, nullable=True)
+    sent = Column(Integer, nullable=False, server_default='0')
+    failed = Column(Integer, nullable=False, server_default='0')
+    # the worker currently running the job and how long its claim is valid
+    lease_owner = Column(String, nullable=True)
+    lease_until = Column(DateTime(timezone=True), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+
+class BroadcastDelivery(Base):
+    __tablename__ = 'broadcast_deliveries'
+
+    job_id = Column(Integer, ForeignKey('broadcast_jobs.id', ondelete='CASCADE'), primary_key=True)
+    chat_id = Column(BigInteger, primary_key=True)
+    # claimed -> sent | failed; claimed rows found on resume become unknown
+    status = Column(String, nullable=False, server_default='claimed')
+    error = Column(String, nullable=True)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class TelegramFileId(Base):
+    __tablename__ = 'telegram_file_ids'
+
+    # one row per image URL; a new ETag means a new upload and replaces it
+    url = Column(String, primary_key=True)
+    etag = Column(String, nullable=False)
+    file_id = Column(String, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+
+
+class ProcessedUpdate(Base):
+    __tablename__ = 'processed_updates'
+
+    # Telegram update_ids claimed by some worker; rows older than DEDUP_TTL are pruned
+    update_id = Column(BigInteger, primary_key=True, autoincrement=False)
+    received_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+
+
+# Raw engagement events (app/events.py), one partition per UTC day
+# (events_YYYYMMDD, created and dropped by app/events.py) plus
+# events_default for anything outside them. No key: rows are only ever
+# COPYed in and aggregated into event_daily.
+events = Table(
+    'events', Base.metadata,
+    Column('created_at', DateTime(timezone=True), nullable=False, server_default=func.now()),
+    # open_menu, open_slot, back_to_slots, dwell, play, broadcast_created, broadcast_sent
+    Column('kind', String, nullable=False),
+    Column('chat_id', BigInteger, nullable=True),
+    Column('lang', String, nullable=True),
+    Column('slot', String, nullable=True),
+    # the slot's position in that day's ranking
+    Column('rank', SmallInteger, nullable=True),
+    # seconds for dwell, messages for broadcast_sent
+    Column('value', Float, nullable=True),
+    postgresql_partition_by='RANGE (created_at)',
+)
+
+
+class EventDaily(Base):
+    __tablename__ = 'event_daily'
+
+    # UTC day; '' stands for no language/slot so the key has no NULLs
+    day = Column(Date, primary_key=True)
+    kind = Column(String, primary_key=True)
+    lang = Column(String, primary_key=True)
+    slot = Column(String, primary_key=True)
+    events = Column(BigInteger, nullable=False)
+    users = Column(BigInteger, nullable=False)
+    value = Column(Float, nullable=False, server_default='0')
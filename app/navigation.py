@@ -0,0 +1,69 @@
+# app/navigation.py
+import asyncio
+import logging
+from telegram import CallbackQuery, InlineKeyboardMarkup, InputMediaPhoto, Message
+from telegram.error import BadRequest
+
+logger = logging.getLogger(__name__)
+
+# old menu messages being deleted in the background
+_CLEANUP: set[asyncio.Task] = set()
+
+
+def _retire(message: Message) -> None:
+    """Deletes a replaced menu message without holding up the click."""
+    async def delete():
+        try:
+            await message.delete()
+        except Exception:
+            pass
+    task = asyncio.create_task(delete())
+    _CLEANUP.add(task)
+    task.add_done_callback(_CLEANUP.discard)
+
+
+def _not_modified(e: BadRequest) -> bool:
+    return "Message is not modified" in str(e)
+
+
+async def show_text(query: CallbackQuery, text: str, reply_markup: InlineKeyboardMarkup,
+                    parse_mode: str = "Markdown") -> Message:
+    """
+    Turns the chat's menu message into a text screen. A text message is
+    edited in place (one API call). A photo cannot become text, so a new
+    message is sent and the old one deleted in the background.
+    """
+    message = query.message
+    if not message.photo:
+        try:
+            return await query.edit_message_text(text, parse_mode=parse_mode, reply_markup=reply_markup)
+        except BadRequest as e:
+            if _not_modified(e):
+                return message
+            logger.info("Editing menu failed, sending a new one: %s", e)
+    new = await message.reply_text(text, parse_mode=parse_mode, reply_markup=reply_markup)
+    _retire(message)
+    return new
+
+
+async def show_photo(query: CallbackQuery, photo: str, caption: str, reply_markup: InlineKeyboardMarkup,
+                     parse_mode: str = "HTML") -> Message:
+    """
+    Turns the chat's menu message into a photo card: a photo message gets
+    its media swapped in place, anything else is replaced by a new photo
+    message and deleted in the background.
+    """
+    message = query.message
+    if message.photo:
+        try:
+            return await query.edit_message_media(
+                InputMediaPhoto(photo, caption=caption, parse_mode=parse_mode),
+                reply_markup=reply_markup,
+            )
+        except BadRequest as e:
+            if _not_modified(e):
+                return message
+            logger.info("Editing photo card failed, sending a new one: %s", e)
+    new = await message.reply_photo(photo=photo, caption=caption, parse_mode=parse_mode, reply_markup=reply_markup)
+    _retire(message)
+    return new
@@ -0,0 +1,127 @@
+# app/persistence.py
+from collections import OrderedDict
+from typing import Optional
+from telegram.ext import Application, BasePersistence, PersistenceInput
+from app.batching import BatchWriter
+from app.coordination import notify, subscribe
+from app.queries import queries
+from app.metrics import cache_lookup
+
+_MISSING = object()
+
+
+class UserStatePersistence(BatchWriter, BasePersistence):
+    """
+    Persists `context.user_data['lang']` in users.lang; nothing else is
+    stored. Reads go through a bounded LRU (evicting a user also drops
+    their user_data), changed languages are upserted in batches, and
+    stored changes are announced to the other workers.
+    """
+
+    def __init__(self, cache_size: int, update_interval: float):
+        BasePersistence.__init__(
+            self,
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval,
+        )
+        # never start()ed: changes flush_soon(), and Application.stop() calls flush()
+        BatchWriter.__init__(self, flush_interval=update_interval)
+        self.cache_size = cache_size
+        self.application: Optional[Application] = None
+        self._cache: OrderedDict[int, Optional[str]] = OrderedDict()
+        # the dirty entries: user_id -> lang
+        self._buffer: dict[int, str] = {}
+        subscribe("user_state.lang", self._apply_remote)
+
+    def _apply_remote(self, pairs: list) -> None:
+        """Languages another worker just stored."""
+        for user_id, lang in pairs:
+            if user_id in self._cache:
+                self._remember(user_id, lang)
+            if self.application is not None and user_id in self.application.user_data:
+                self.application.user_data[user_id]["lang"] = lang
+
+    def _remember(self, user_id: int, lang: Optional[str]) -> None:
+        self._cache[user_id] = lang
+        self._cache.move_to_end(user_id)
+        while len(self._cache) > self.cache_size:
+            evicted, _ = self._cache.popitem(last=False)
+            if evicted in self._buffer:
+                # not written yet; keep it until the flush
+                self._cache[evicted] = self._buffer[evicted]
+                break
+            if self.application is not None:
+                self.application.drop_user_data(evicted)
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        cached = self._cache.get(user_id, _MISSING)
+        if cached is _MISSING:
+            cache_lookup("user_state", "miss")
+            cached = await queries.fetchval("lookup_lang", user_id)
+            self._remember(user_id, cached)
+        else:
+            cache_lookup("user_state", "hit")
+            self._cache.move_to_end(user_id)
+        if cached is not None and "lang" not in user_data:
+            user_data["lang"] = cached
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        lang = data.get("lang")
+        # an empty dict is a dropped/recreated entry, never a real reset
+        if lang is None or self._cache.get(user_id, _MISSING) == lang:
+            return
+        self._buffer[user_id] = lang
+        self._remember(user_id, lang)
+        # let the rest of this persistence round mark its users first
+        self.flush_soon(delay=0.1)
+
+    def _put_back(self, batch: dict[int, str]) -> None:
+        # newer changes win
+        self._buffer = {**batch, **self._buffer}
+
+    async def _write(self, batch: dict[int, str]) -> None:
+        await queries.execute("store_langs", list(batch), list(batch.values()))
+        pairs = list(batch.items())
+        for i in range(0, len(pairs), 200):
+            notify("user_state.lang", pairs[i:i + 200])
+
+    async def drop_user_data(self, user_id: int) -> None:
+        # only ever called for LRU evictions; the stored language stays
+        pass
+
+    async def get_user_data(self) -> dict:
+        # loaded lazily per user in refresh_user_data
+        return {}
+
+    async def get_chat_data(self) -> dict:
+        return {}
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name: str) -> dict:
+        return {}
+
+    async def update_conversation(self, name: str, key, new_state) -> None:
+        pass
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        pass
+
+    async def update_bot_data(self, data: dict) -> None:
+        pass
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
@@ -0,0 +1,121 @@
+# app/prewarm.py
+import asyncio
+import logging
+from datetime import date, datetime, timedelta
+from typing import Optional
+from telegram.error import RetryAfter
+from app.config import settings
+from app.file_ids import file_id_cache
+from app.languages import LANGUAGES
+from app.ranking import get_ranking
+from app.spaces_client import Catalog, cached_catalog, prefetch_catalog, refresh_catalog
+
+logger = logging.getLogger(__name__)
+
+
+async def _warm_photos(bot, catalog: Catalog) -> None:
+    """
+    Sends every slot image Telegram does not have yet to the warm-up chat
+    once, records the file_id and deletes the message, so the first user
+    to open the slot gets a file_id send instead of a CDN fetch.
+    """
+    for slot in catalog.slots:
+        url, etag = slot["image"], slot.get("etag", "")
+        if file_id_cache.get(url, etag):
+            continue
+        try:
+            msg = await bot.send_photo(settings.WARMUP_CHAT_ID, photo=url, disable_notification=True)
+        except RetryAfter as e:
+            await asyncio.sleep(e.retry_after)
+            continue
+        except Exception:
+            logger.exception("Warm-up upload of %s failed", url)
+            continue
+        file_id_cache.put(url, etag, msg.photo[-1].file_id)
+        try:
+            await msg.delete()
+        except Exception:
+            pass
+
+
+class Prewarmer:
+    """
+    Background scheduler that keeps each language's catalog, ranking and
+    photo file_ids ready before users ask for them.
+
+    Every `interval` seconds it makes sure today's catalog is cached (and
+    re-lists it while it still falls back to yesterday's images). Within
+    `lead` of midnight it also polls for tomorrow's images and, once they
+    are uploaded, caches tomorrow's catalog and warms its photos, so the
+    switch at midnight is a plain cache hit.
+    """
+
+    def __init__(self, bot, interval: float, lead: timedelta):
+        self.bot = bot
+        self.interval = interval
+        self.lead = lead
+        self._task: Optional[asyncio.Task] = None
+        # (lang, stamp, images and etags) this worker already optimized
+        self._optimized: set[tuple[str, str, frozenset]] = set()
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    async def _run(self) -> None:
+        while True:
+            for lang in LANGUAGES:
+                try:
+                    await self.warm(lang)
+                except Exception:
+                    logger.exception("Prewarming %s failed", lang)
+            await asyncio.sleep(self.interval)
+
+    async def _optimize(self, lang: str, catalog: Catalog, day: date) -> Catalog:
+        """
+        Makes the .tg.jpg variants (app/images.py) for a newly published
+        day, then re-lists the catalog so they are what gets warmed and sent.
+        Runs once per set of originals; images kept as they are stay unoptimized.
+        """
+        if all(slot.get("optimized") for slot in catalog.slots):
+            return catalog
+        key = (lang, catalog.source_stamp, frozenset((slot["source"], slot["etag"]) for slot in catalog.slots))
+        if key in self._optimized:
+            return catalog
+        from app.images import available, optimize_day, summarize
+
+        if not available():
+            logger.warning("OPTIMIZE_ON_PUBLISH is set but Pillow is not installed")
+            return catalog
+        self._optimized.add(key)
+        results = await asyncio.to_thread(optimize_day, lang, catalog.source_stamp)
+        logger.info("Optimized %s images for %s: %s", lang, catalog.source_stamp, summarize(results))
+        return await refresh_catalog(lang, day)
+
+    async def warm(self, lang: str) -> None:
+        today = date.today()
+        catalog = cached_catalog(lang, today)
+        if catalog is None or catalog.source_stamp != catalog.stamp:
+            catalog = await refresh_catalog(lang, today)
+        if settings.OPTIMIZE_ON_PUBLISH:
+            catalog = await self._optimize(lang, catalog, today)
+        await get_ranking(lang)
+        if settings.WARMUP_CHAT_ID:
+            await _warm_photos(self.bot, catalog)
+
+        tomorrow = today + timedelta(days=1)
+        if datetime.combine(tomorrow, datetime.min.time()) - datetime.now() > self.lead:
+            return
+        upcoming = cached_catalog(lang, tomorrow)
+        if upcoming is None:
+            upcoming = await prefetch_catalog(lang, tomorrow)
+            if upcoming is not None:
+                logger.info("Prefetched %s catalog for %s", lang, upcoming.stamp)
+        if upcoming is not None and settings.OPTIMIZE_ON_PUBLISH:
+            upcoming = await self._optimize(lang, upcoming, tomorrow)
+        if upcoming is not None and settings.WARMUP_CHAT_ID:
+            await _warm_photos(self.bot, upcoming)
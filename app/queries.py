@@ -0,0 +1,180 @@
+# app/queries.py
+"""
+The queries the bot runs for every update, as named prepared statements
+on a dedicated asyncpg pool. Each connection prepares all of STATEMENTS
+once, when it is opened, so a call is one Bind/Execute round trip with
+no SQL built, compiled or parsed. Less frequent queries (broadcast jobs,
+file_ids, admin pages) stay on `app.database`.
+"""
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Optional
+import asyncpg
+from asyncpg.prepared_stmt import PreparedStatement
+from app.config import settings
+from app.metrics import DB_SECONDS, PG_POOL, PG_POOL_WAIT
+
+# chat_ids below every real one, for the first keyset page
+MIN_CHAT_ID = -(2 ** 63)
+
+STATEMENTS = {
+    # UserStatePersistence
+    "lookup_lang": "SELECT lang FROM users WHERE chat_id = $1",
+    "store_langs": """
+        INSERT INTO users (chat_id, lang)
+        SELECT * FROM unnest($1::bigint[], $2::text[])
+        ON CONFLICT (chat_id) DO UPDATE SET lang = EXCLUDED.lang
+    """,
+    # UserRegistrar; the language flush may have created the row first,
+    # without a username or last_seen
+    "register_users": """
+        INSERT INTO users (chat_id, username, last_seen)
+        SELECT u.chat_id, u.username, now() FROM unnest($1::bigint[], $2::text[]) AS u(chat_id, username)
+        ON CONFLICT (chat_id) DO UPDATE
+        SET username = coalesce(users.username, EXCLUDED.username),
+            last_seen = coalesce(users.last_seen, EXCLUDED.last_seen)
+        WHERE users.username IS NULL OR users.last_seen IS NULL
+    """,
+    "touch_users": "UPDATE users SET last_seen = now(), is_active = true WHERE chat_id = ANY($1::bigint[])",
+    "deactivate_users": "UPDATE users SET is_active = false WHERE chat_id = ANY($1::bigint[]) AND is_active",
+    # recipient paging; a NULL language or day count leaves that filter off,
+    # and users who never picked a language are shown the AZ menu
+    "user_ids_page": "SELECT chat_id FROM users WHERE chat_id > $1 ORDER BY chat_id LIMIT $2",
+    "recipients_page": """
+        SELECT chat_id FROM users
+        WHERE is_active AND chat_id > $1
+          AND ($2::text IS NULL OR lang = $2 OR (lang IS NULL AND $2 = 'AZ'))
+          AND ($3::int IS NULL OR last_seen >= now() - make_interval(days => $3))
+        ORDER BY chat_id LIMIT $4
+    """,
+    "count_recipients": """
+        SELECT count(*) FROM users
+        WHERE is_active AND chat_id IS NOT NULL
+          AND ($1::text IS NULL OR lang = $1 OR (lang IS NULL AND $1 = 'AZ'))
+          AND ($2::int IS NULL OR last_seen >= now() - make_interval(days => $2))
+          AND chat_id <> ALL($3::bigint[])
+    """,
+    # UpdateDeduplicator
+    "claim_updates": """
+        INSERT INTO processed_updates (update_id)
+        SELECT unnest($1::bigint[])
+        ON CONFLICT DO NOTHING
+        RETURNING update_id
+    """,
+}
+
+
+class StatementPool:
+    """
+    An asyncpg pool whose connections each hold `statements` prepared
+    under their names. Calls are timed per statement, and the time spent
+    waiting for a free connection is recorded separately, so a pool too
+    small for a burst shows up as wait time rather than slow queries.
+
+    With `statement_cache_size=0` nothing is prepared and every call sends
+    its SQL as an unnamed statement, which works behind PgBouncer.
+    """
+
+    def __init__(self, dsn: str, min_size: int, max_size: int, timeout: float,
+                 statement_cache_size: int, statements: dict[str, str]):
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.statement_cache_size = statement_cache_size
+        self.statements = statements
+        self._pool: Optional[asyncpg.Pool] = None
+        # backend pid -> that connection's prepared statements
+        self._prepared: dict[int, dict[str, PreparedStatement]] = {}
+        self._waiting = 0
+        PG_POOL.set_function(self._connections)
+
+    async def start(self) -> None:
+        self._pool = await asyncpg.create_pool(
+            self.dsn,
+            min_size=self.min_size,
+            max_size=self.max_size,
+            statement_cache_size=self.statement_cache_size,
+            init=self._init,
+        )
+
+    async def stop(self) -> None:
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+        self._prepared.clear()
+
+    async def _init(self, conn: asyncpg.Connection) -> None:
+        if not self.statement_cache_size:
+            return
+        pid = conn.get_server_pid()
+        self._prepared[pid] = {
+            name: await conn.prepare(sql, name=f"rtp_{name}") for name, sql in self.statements.items()
+        }
+        conn.add_termination_listener(lambda _: self._prepared.pop(pid, None))
+
+    def _connections(self) -> dict:
+        if self._pool is None:
+            return {}
+        size, idle = self._pool.get_size(), self._pool.get_idle_size()
+        return {("busy",): size - idle, ("idle",): idle, ("max",): self._pool.get_max_size(),
+                ("waiting",): self._waiting}
+
+    @asynccontextmanager
+    async def _acquire(self) -> AsyncIterator[asyncpg.Connection]:
+        self._waiting += 1
+        start = time.perf_counter()
+        try:
+            conn = await self._pool.acquire(timeout=self.timeout)
+        finally:
+            self._waiting -= 1
+            PG_POOL_WAIT.observe(time.perf_counter() - start)
+        try:
+            yield conn
+        finally:
+            await self._pool.release(conn)
+
+    async def _run(self, name: str, method: str, args: tuple) -> Any:
+        async with self._acquire() as conn:
+            start = time.perf_counter()
+            try:
+                statement = self._prepared.get(conn.get_server_pid(), {}).get(name)
+                if statement is None:
+                    return await getattr(conn, method)(self.statements[name], *args)
+                return await getattr(statement, method)(*args)
+            finally:
+                DB_SECONDS.observe(time.perf_counter() - start, call=name)
+
+    async def fetch(self, name: str, *args) -> list[asyncpg.Record]:
+        return await self._run(name, "fetch", args)
+
+    async def fetchval(self, name: str, *args) -> Any:
+        return await self._run(name, "fetchval", args)
+
+    async def execute(self, name: str, *args) -> None:
+        # PreparedStatement has no execute(); fetch() runs it just the same
+        await self._run(name, "fetch", args)
+
+    async def copy(self, table: str, columns: list[str], records: list[tuple]) -> None:
+        """Bulk-loads `records` into `table` with COPY ... FROM STDIN (binary)."""
+        async with self._acquire() as conn:
+            start = time.perf_counter()
+            try:
+                await conn.copy_records_to_table(table, columns=columns, records=records)
+            finally:
+                DB_SECONDS.observe(time.perf_counter() - start, call=f"copy_{table}")
+
+
+def _dsn(url: str) -> str:
+    # DATABASE_URL is written for SQLAlchemy ("postgresql+asyncpg://...")
+    return url.replace("+asyncpg", "", 1)
+
+
+queries = StatementPool(
+    _dsn(settings.DATABASE_URL),
+    min_size=settings.PG_POOL_MIN_SIZE,
+    max_size=settings.PG_POOL_MAX_SIZE,
+    timeout=settings.PG_POOL_TIMEOUT,
+    statement_cache_size=settings.PG_STATEMENT_CACHE_SIZE,
+    statements=STATEMENTS,
+)
@@ -0,0 +1,128 @@
+# app/ranking.py
+import hashlib
+import hmac
+from dataclasses import dataclass
+from datetime import datetime
+from types import MappingProxyType
+from typing import Mapping, Optional
+from urllib.parse import quote
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from app.config import settings
+from app.languages import LANGUAGES
+from app.metrics import cache_lookup
+from app.spaces_client import Catalog, get_catalog, load_play_url, play_url_object
+
+MEDALS = ["🥇", "🥈", "🥉"]
+
+
+def medal_prefix(idx: int) -> str:
+    """🥇/🥈/🥉 for the top three, then “4.”, “5.”, etc."""
+    return MEDALS[idx] if idx < 3 else f"{idx + 1}."
+
+
+def build_caption(rank: int, name: str, meta: dict) -> str:
+    return (
+        f"{medal_prefix(rank)} <b>{name}</b>\n"
+        f"└🎮 Sağlayıcı: {meta.get('provider', '—')}\n"
+        f"- Əsas RTP: {meta.get('base_rtp', '—')}%\n"
+        f"⚡️ Cari RTP: <b>{meta.get('instant_rtp', '—')}%</b>\n"
+        f"Həftəlik RTP: {meta.get('weekly_rtp', '—')}%"
+    )
+
+
+@dataclass(frozen=True)
+class SlotRanking:
+    """
+    The day's slot list for one language in metadata.json order, with
+    everything the menu handlers need prebuilt and indexed by slot name.
+    """
+    catalog: Catalog
+    header: str
+    names: tuple[str, ...]
+    slots: Mapping[str, dict]
+    ranks: Mapping[str, int]
+    captions: Mapping[str, str]
+    keyboard: InlineKeyboardMarkup
+
+
+def build_ranking(catalog: Catalog) -> SlotRanking:
+    tpl = LANGUAGES[catalog.lang]
+    today = datetime.strptime(catalog.stamp, "%Y%m%d").strftime("%d.%m.%Y")
+    header = tpl["top_slots"].format(today=today) + "\n\n" + tpl["description"]
+
+    # preserve only those that exist in the listing, in metadata.json order
+    slot_map = {s["name"]: s for s in catalog.slots}
+    names = tuple(name for name in catalog.metadata if name in slot_map)
+
+    keyboard = [
+        [InlineKeyboardButton(f"{medal_prefix(idx)} {name}", callback_data=f"slot|{name}")]
+        for idx, name in enumerate(names)
+    ]
+    keyboard.append([InlineKeyboardButton("⬅️ Back", callback_data="back_to_language")])
+
+    return SlotRanking(
+        catalog=catalog,
+        header=header,
+        names=names,
+        slots=MappingProxyType({name: slot_map[name] for name in names}),
+        ranks=MappingProxyType({name: idx for idx, name in enumerate(names)}),
+        captions=MappingProxyType({
+            name: build_caption(idx, name, catalog.metadata.get(name, {}))
+            for idx, name in enumerate(names)
+        }),
+        keyboard=InlineKeyboardMarkup(keyboard),
+    )
+
+
+# lang -> ranking built from the catalog currently cached for that language
+_RANKINGS: dict[str, SlotRanking] = {}
+
+
+async def get_ranking(lang: str) -> SlotRanking:
+    """
+    Returns the ranking for today's catalog, rebuilding it only when the
+    catalog cache hands back a different (refreshed or next-day) catalog.
+    """
+    catalog = await get_catalog(lang)
+    ranking = _RANKINGS.get(lang)
+    if ranking is None or ranking.catalog is not catalog:
+        cache_lookup("ranking", "miss")
+        ranking = _RANKINGS[lang] = build_ranking(catalog)
+    else:
+        cache_lookup("ranking", "hit")
+    return ranking
+
+
+def cached_ranking(lang: str) -> Optional[SlotRanking]:
+    """The ranking last built for `lang`, without fetching anything."""
+    return _RANKINGS.get(lang)
+
+
+def play_signature(lang: str, slot: str) -> str:
+    """Keyed with the bot token, so only links the bot built are counted."""
+    message = f"play|{lang}|{slot}".encode()
+    return hmac.new(settings.TELEGRAM_TOKEN.encode(), message, hashlib.sha256).hexdigest()[:16]
+
+
+def play_link(lang: str, slot: str) -> str:
+    """The play button's URL: the /go redirect that counts the click, or the play URL itself."""
+    if not settings.TRACK_PLAY_CLICKS:
+        return load_play_url()
+    return (f"{settings.public_url}/go/play/{quote(lang, safe='')}/{quote(slot, safe='')}"
+            f"?sig={play_signature(lang, slot)}")
+
+
+# (lang, slot) -> slot card keyboard (play link + back); depends only on play_url
+_CARD_KEYBOARDS: dict[tuple[str, str], InlineKeyboardMarkup] = {}
+play_url_object().on_change(lambda _: _CARD_KEYBOARDS.clear())
+
+
+def card_keyboard(lang: str, slot: str) -> InlineKeyboardMarkup:
+    kb = _CARD_KEYBOARDS.get((lang, slot))
+    if kb is None:
+        tpl = LANGUAGES[lang]
+        kb = _CARD_KEYBOARDS[(lang, slot)] = InlineKeyboardMarkup([[
+            InlineKeyboardButton(tpl["check_in"], url=play_link(lang, slot)),
+            InlineKeyboardButton(tpl["back_slots"], callback_data="back_to_slots"),
+        ]])
+    return kb
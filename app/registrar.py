@@ -0,0 +1,100 @@
+# app/registrar.py
+import logging
+import time
+from collections import OrderedDict
+from typing import Optional
+from app.batching import BatchWriter
+from app.broadcast import iter_recipient_pages
+from app.config import settings
+from app.queries import queries
+
+logger = logging.getLogger(__name__)
+
+
+class UserRegistrar(BatchWriter):
+    """
+    Write-behind /start registration. Known chat_ids are kept in memory, so
+    a repeat /start costs no query; new ones are inserted in batches. Each
+    flush also sets last_seen for users seen since the last one (at most
+    once per `seen_resolution` seconds) and deactivates chats a broadcast
+    found unreachable.
+    """
+
+    def __init__(self, batch_size: int, flush_interval: float, seen_resolution: float):
+        super().__init__(flush_interval)
+        self.batch_size = batch_size
+        self.seen_resolution = seen_resolution
+        self._known: set[int] = set()
+        self._pending: dict[int, Optional[str]] = {}
+        # chat_id -> when last_seen was last recorded, oldest first
+        self._touched: OrderedDict[int, float] = OrderedDict()
+        self._seen: set[int] = set()
+        self._gone: set[int] = set()
+
+    async def warm(self) -> None:
+        """Loads every registered chat_id, a keyset page at a time."""
+        async for page in iter_recipient_pages(page_size=10000):
+            self._known.update(page)
+        logger.info("Registrar warmed with %d known users", len(self._known))
+
+    def register(self, chat_id: int, username: Optional[str]) -> None:
+        if chat_id in self._known:
+            return
+        self._known.add(chat_id)
+        self._pending[chat_id] = username
+        if len(self._pending) >= self.batch_size:
+            self.flush_soon()
+
+    def touch(self, chat_id: int) -> None:
+        """Records activity from `chat_id`."""
+        now = time.monotonic()
+        if now - self._touched.get(chat_id, -self.seen_resolution) < self.seen_resolution:
+            return
+        self._touched[chat_id] = now
+        self._touched.move_to_end(chat_id)
+        self._seen.add(chat_id)
+
+    def deactivate(self, chat_id: int) -> None:
+        """BroadcastEngine on_unreachable hook."""
+        self._gone.add(chat_id)
+        # a message from the user after this must reactivate them
+        self._touched.pop(chat_id, None)
+
+    def _forget_touched(self) -> None:
+        # past seen_resolution an entry no longer holds anything back
+        cutoff = time.monotonic() - self.seen_resolution
+        while self._touched and next(iter(self._touched.values())) <= cutoff:
+            self._touched.popitem(last=False)
+
+    async def flush(self) -> None:
+        self._forget_touched()
+        await super().flush()
+
+    def _take(self) -> Optional[tuple]:
+        batch = self._pending, self._gone, self._seen
+        self._pending, self._gone, self._seen = {}, set(), set()
+        return batch if any(batch) else None
+
+    def _put_back(self, batch: tuple) -> None:
+        pending, gone, seen = batch
+        self._pending = {**pending, **self._pending}
+        self._gone |= gone
+        self._seen |= seen
+
+    async def _write(self, batch: tuple) -> None:
+        # each statement is idempotent, so a failed flush is retried whole
+        pending, gone, seen = batch
+        if pending:
+            await queries.execute("register_users", list(pending), list(pending.values()))
+        if gone:
+            await queries.execute("deactivate_users", list(gone))
+        # after the deactivations, so a user who came back stays active
+        if seen:
+            await queries.execute("touch_users", list(seen))
+
+
+registrar = UserRegistrar(
+    batch_size=settings.REGISTER_BATCH_SIZE,
+    flush_interval=settings.REGISTER_FLUSH_INTERVAL,
+    seen_resolution=settings.LAST_SEEN_RESOLUTION,
+)
@@ -1,86 +1,395 @@
 # app/spaces_client.py
-import boto3
-from botocore.client import Config
-from datetime import date, timedelta
+import asyncio
+import logging
+import threading
+import time
+from dataclasses import dataclass, replace
+from typing import Any, Callable, Iterator, Optional
+from datetime import date, datetime, timedelta
+from app.batching import log_task_failure
 from app.config import settings
+from app.coordination import notify, subscribe
+from app.languages import LANGUAGES
+from app.metrics import S3_SECONDS, cache_lookup
 import json
 from botocore.exceptions import ClientError
 
-_session = boto3.session.Session()
-_s3 = _session.client(
-    "s3",
-    region_name=settings.SPACES_REGION,
-    endpoint_url=f"https://{settings.SPACES_REGION}.digitaloceanspaces.com",
-    aws_access_key_id=settings.SPACES_KEY,
-    aws_secret_access_key=settings.SPACES_SECRET,
-    config=Config(signature_version="s3v4"),
-)
+logger = logging.getLogger(__name__)
 
-_PLAY_URL_CACHE: str = None
+_s3 = None
+_s3_lock = threading.Lock()
 
 
-def load_slot_metadata(lang: str) -> dict[str, dict]:
+def _client():
     """
-    Fetches <lang>/metadata.json from Spaces and returns
-    a mapping slot_name -> its metadata dict.
+    The Spaces client, built on first use: importing boto3 and loading the
+    S3 service model takes a few hundred milliseconds that startup and any
+    importer of this module would otherwise pay up front. Calls run in
+    worker threads, hence the lock.
     """
-    key = f"{lang}/metadata.json"
-    try:
-        resp = _s3.get_object(Bucket=settings.SPACES_NAME, Key=key)
-    except ClientError:
-        return {}
-    body = resp["Body"].read()
-    return json.loads(body)
+    global _s3
+    if _s3 is None:
+        with _s3_lock:
+            if _s3 is None:
+                import boto3
+                from botocore.client import Config
+
+                client = boto3.session.Session().client(
+                    "s3",
+                    region_name=settings.SPACES_REGION,
+                    endpoint_url=settings.SPACES_ENDPOINT_URL or f"https://{settings.SPACES_REGION}.digitaloceanspaces.com",
+                    aws_access_key_id=settings.SPACES_KEY,
+                    aws_secret_access_key=settings.SPACES_SECRET,
+                    config=Config(signature_version="s3v4"),
+                )
+                client.meta.events.register("before-call.s3", _start_timer)
+                client.meta.events.register("after-call.s3", _stop_timer)
+                _s3 = client
+    return _s3
+
+
+# time every S3 API call (each paginator page included) through botocore's
+# event hooks; they run in whichever thread made the call
+def _start_timer(context: dict, **_) -> None:
+    context["metrics_started"] = time.perf_counter()
+
+
+def _stop_timer(context: dict, model, **_) -> None:
+    started = context.pop("metrics_started", None)
+    if started is not None:
+        S3_SECONDS.observe(time.perf_counter() - started, operation=model.name)
+
+
+class WatchedObject:
+    """
+    A small Spaces object kept parsed in memory.
+
+    `refresh()` revalidates it with a conditional GET (If-None-Match on the
+    last ETag): an unchanged object costs a 304 and no parsing, a changed
+    one is re-parsed and every `on_change` callback gets the new value.
+    Once loaded, a failed fetch keeps serving the last good copy.
+    """
+
+    def __init__(self, key: str, parse: Callable[[bytes], Any], default: Any = None, required: bool = False):
+        self.key = key
+        self.parse = parse
+        self.default = default
+        self.required = required
+        self.value = default
+        self.etag: Optional[str] = None
+        self.loaded = False
+        self._listeners: list[Callable[[Any], None]] = []
+        self._lock = asyncio.Lock()
+
+    def on_change(self, callback: Callable[[Any], None]) -> None:
+        self._listeners.append(callback)
+
+    def _fetch(self) -> bool:
+        """Blocking conditional GET; returns True if the value changed."""
+        kwargs = {"Bucket": settings.SPACES_NAME, "Key": self.key}
+        if self.etag:
+            kwargs["IfNoneMatch"] = self.etag
+        try:
+            resp = _client().get_object(**kwargs)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("304", "NotModified"):
+                return False
+            if self.loaded:
+                logger.warning("Revalidating %s failed: %s", self.key, e)
+                return False
+            if self.required:
+                raise
+            self.loaded = True
+            return False
+        self.value = self.parse(resp["Body"].read())
+        self.etag = resp.get("ETag")
+        self.loaded = True
+        return True
+
+    async def refresh(self) -> bool:
+        async with self._lock:
+            changed = await asyncio.to_thread(self._fetch)
+        if changed:
+            for callback in self._listeners:
+                try:
+                    callback(self.value)
+                except Exception:
+                    logger.exception("Change callback for %s failed", self.key)
+        return changed
+
+
+def _parse_play_url(body: bytes) -> str:
+    # read and strip any whitespace/newlines
+    return body.decode("utf-8").strip()
+
+
+def _announce_change(obj: WatchedObject) -> None:
+    # other workers revalidate right away instead of on their next interval
+    obj.on_change(lambda _: notify("object.changed", {"key": obj.key}))
+
+
+_PLAY_URL = WatchedObject("config/play_url.txt", _parse_play_url, required=True)
+_announce_change(_PLAY_URL)
+_METADATA: dict[str, WatchedObject] = {}
+
+
+def play_url_object() -> WatchedObject:
+    return _PLAY_URL
+
+
+def metadata_object(lang: str) -> WatchedObject:
+    obj = _METADATA.get(lang)
+    if obj is None:
+        obj = _METADATA[lang] = WatchedObject(f"{lang}/metadata.json", json.loads, default={})
+        obj.on_change(lambda metadata: _apply_metadata(lang, metadata))
+        _announce_change(obj)
+    return obj
+
+
+async def _on_object_changed(data: dict) -> None:
+    key = data["key"]
+    obj = _PLAY_URL if key == _PLAY_URL.key else metadata_object(key.split("/", 1)[0])
+    await obj.refresh()
+
+
+subscribe("object.changed", _on_object_changed)
 
 
 def load_play_url() -> str:
     """
-    Fetches (and caches) the one-play-url from config/play_url.txt
-    in your Spaces bucket, so you can update it without a redeploy.
+    Returns the one-play-url from config/play_url.txt in your Spaces
+    bucket. It is fetched at startup (play_url_object().refresh()) and
+    revalidated in the background, so this never touches the network and
+    you can update it without a redeploy.
+    """
+    return _PLAY_URL.value
+
+
+async def revalidate_objects() -> None:
+    """Conditional-GETs play_url.txt and every language's metadata.json."""
+    objects = [_PLAY_URL] + [metadata_object(lang) for lang in LANGUAGES]
+    results = await asyncio.gather(*(obj.refresh() for obj in objects), return_exceptions=True)
+    for obj, result in zip(objects, results):
+        if isinstance(result, Exception):
+            logger.warning("Revalidating %s failed: %r", obj.key, result)
+
+
+async def watch_objects(interval: float) -> None:
+    while True:
+        await revalidate_objects()
+        await asyncio.sleep(interval)
+
+
+def _iter_objects(prefix: str, delimiter: str = None) -> Iterator[dict]:
+    """
+    Yields every object under `prefix`, following continuation tokens so
+    listings past 1000 keys are complete. Pages are fetched lazily.
     """
-    global _PLAY_URL_CACHE
-    if _PLAY_URL_CACHE is None:
-        obj = _s3.get_object(
-            Bucket=settings.SPACES_NAME,
-            Key="config/play_url.txt"
-        )
-        # read and strip any whitespace/newlines
-        _PLAY_URL_CACHE = obj["Body"].read().decode("utf-8").strip()
-    return _PLAY_URL_CACHE
+    kwargs = {"Bucket": settings.SPACES_NAME, "Prefix": prefix}
+    if delimiter:
+        kwargs["Delimiter"] = delimiter
+    for page in _client().get_paginator("list_objects_v2").paginate(**kwargs):
+        yield from page.get("Contents", [])
+
+
+# Telegram-sized copies made by app/images.py sit next to their originals
+VARIANT_SUFFIX = ".tg.jpg"
+
+
+def variant_key(key: str) -> str:
+    """"AZ/dogs_20250517.png" -> "AZ/dogs_20250517.tg.jpg" """
+    return key.rsplit(".", 1)[0] + VARIANT_SUFFIX
+
+
+def _slot(name: str, obj: dict, variant: dict = None) -> dict:
+    # the optimized copy, unless the original was re-uploaded after it was made
+    fresh = (
+        variant is not None and settings.SERVE_IMAGE_VARIANTS
+        and variant.get("LastModified") and obj.get("LastModified")
+        and variant["LastModified"] >= obj["LastModified"]
+    )
+    served = variant if fresh else obj
+    # build URL from the dynamically derived property
+    url = f"{settings.cdn_base}/{served['Key']}"
+    # the ETag changes whenever the object is re-uploaded
+    etag = served.get("ETag", "").strip('"')
+    return {
+        "name": name.replace("_", " ").title(), "image": url, "etag": etag,
+        "source": obj["Key"], "optimized": served is variant,
+    }
+
+
+def _split_variants(objects: list[dict]) -> tuple[list[dict], dict[str, dict]]:
+    variants = {obj["Key"]: obj for obj in objects if obj["Key"].endswith(VARIANT_SUFFIX)}
+    return [obj for obj in objects if obj["Key"] not in variants], variants
 
 
 def _list_for_stamp(lang: str, stamp: str) -> list[dict]:
-    prefix = f"{lang}/"
-    resp = _s3.list_objects_v2(Bucket=settings.SPACES_NAME, Prefix=prefix)
+    """
+    Lists the slot images for one day. Two key layouts are supported:
 
+    - date-partitioned, `<lang>/<YYYYMMDD>/<name>.png`: the listing is
+      narrowed to that day's prefix server-side, so its cost depends only
+      on the day's slot count;
+    - the original flat `<lang>/<name>_<YYYYMMDD>.png`, used when the day
+      has no partition. The delimiter keeps partitioned days out of it.
+
+    A slot whose `.tg.jpg` variant is up to date is served from that.
+    """
     slots = []
-    for obj in resp.get("Contents", []):
+    objects, variants = _split_variants(list(_iter_objects(f"{lang}/{stamp}/")))
+    for obj in objects:
+        filename = obj["Key"].rsplit("/", 1)[1]  # "dogs.png"
+        base, _, ext = filename.rpartition(".")
+        if ext in ("png", "jpg"):
+            slots.append(_slot(base, obj, variants.get(variant_key(obj["Key"]))))
+    if slots:
+        return slots
+
+    # keep only the day's keys while streaming, not the whole flat history
+    suffixes = (f"_{stamp}.png", f"_{stamp}.jpg", f"_{stamp}{VARIANT_SUFFIX}")
+    objects, variants = _split_variants([
+        obj for obj in _iter_objects(f"{lang}/", delimiter="/") if obj["Key"].endswith(suffixes)
+    ])
+    for obj in objects:
         key = obj["Key"]  # e.g. "TR/dogs_20250517.png"
         filename = key.split("/", 1)[1]  # "dogs_20250517.png"
-        if not filename.endswith(f"_{stamp}.png") and not filename.endswith(f"_{stamp}.jpg"):
-            continue
-
         base = filename.rsplit("_", 1)[0]  # "dogs"
-        name = base.replace("_", " ").title()
-        # build URL from the dynamically derived property
-        url = f"{settings.cdn_base}/{key}"
-        slots.append({"name": name, "image": url})
+        slots.append(_slot(base, obj, variants.get(variant_key(key))))
 
     return slots
 
 
-def list_today_slots(lang: str) -> list[dict]:
+@dataclass(frozen=True)
+class Catalog:
+    """One language's slots and metadata for a single day."""
+    lang: str
+    stamp: str
+    slots: list[dict]
+    metadata: dict[str, dict]
+    fetched_at: float
+    # stamp of the images actually listed; the day before `stamp` while
+    # today's images are not uploaded yet
+    source_stamp: str = None
+
+
+# (lang, YYYYMMDD) -> Catalog, plus the refresh task currently running per key
+_CATALOG_CACHE: dict[tuple[str, str], Catalog] = {}
+_CATALOG_INFLIGHT: dict[tuple[str, str], asyncio.Task] = {}
+
+
+async def _fetch_catalog(lang: str, day: date, exact: bool = False) -> Optional[Catalog]:
     """
-    First try to list today’s slots; if none found, fall back to yesterday.
+    Lists the day's slots and loads metadata, then caches the result.
+    It falls back to the previous day's images, unless `exact` is set, in
+    which case nothing is cached or returned until the day's own images
+    exist.
     """
-    today = date.today()
-    today_str = today.strftime("%Y%m%d")
+    stamp = day.strftime("%Y%m%d")
+    # boto3 is blocking, so the listing runs in a worker thread while the
+    # metadata is revalidated (a 304 when it has not changed)
+    metadata_obj = metadata_object(lang)
+    slots, _ = await asyncio.gather(
+        asyncio.to_thread(_list_for_stamp, lang, stamp),
+        metadata_obj.refresh(),
+    )
+    metadata = metadata_obj.value
+    source_stamp = stamp
+    if not slots:
+        if exact:
+            return None
+        source_stamp = (day - timedelta(days=1)).strftime("%Y%m%d")
+        slots = await asyncio.to_thread(_list_for_stamp, lang, source_stamp)
+
+    catalog = Catalog(
+        lang=lang,
+        stamp=stamp,
+        slots=slots,
+        metadata=metadata,
+        fetched_at=time.monotonic(),
+        source_stamp=source_stamp,
+    )
+    previous = _CATALOG_CACHE.get((lang, stamp))
+    if previous is not None and _listing(previous) != _listing(catalog):
+        notify("catalog.changed", {"lang": lang, "stamp": stamp})
+
+    # drop days before today (not before `stamp`: prefetching tomorrow must
+    # leave today's catalog in place)
+    today = date.today().strftime("%Y%m%d")
+    for key in [k for k in _CATALOG_CACHE if k[0] == lang and k[1] < today]:
+        del _CATALOG_CACHE[key]
+    _CATALOG_CACHE[(lang, stamp)] = catalog
+    return catalog
+
+
+async def prefetch_catalog(lang: str, day: date) -> Optional[Catalog]:
+    """
+    Fetches and caches `day`'s catalog ahead of time, but only once that
+    day's images are in Spaces. Returns None until then.
+    """
+    return await _fetch_catalog(lang, day, exact=True)
+
+
+def cached_catalog(lang: str, day: date = None) -> Optional[Catalog]:
+    """The cached catalog for `day`, without fetching or refreshing it."""
+    return _CATALOG_CACHE.get((lang, (day or date.today()).strftime("%Y%m%d")))
+
+
+def _listing(catalog: Catalog) -> set[tuple[str, str]]:
+    return {(slot["image"], slot.get("etag", "")) for slot in catalog.slots}
+
+
+def _on_catalog_changed(data: dict) -> None:
+    # another worker saw new or re-uploaded images; refresh our copy if we have one
+    if (data["lang"], data["stamp"]) in _CATALOG_CACHE:
+        _refresh_catalog(data["lang"], datetime.strptime(data["stamp"], "%Y%m%d").date())
+
+
+subscribe("catalog.changed", _on_catalog_changed)
+
+
+def _apply_metadata(lang: str, metadata: dict[str, dict]) -> None:
+    # swap the new metadata into cached catalogs; their slot listings are
+    # unaffected, and rankings rebuild because the Catalog object changes
+    for key, entry in list(_CATALOG_CACHE.items()):
+        if key[0] == lang and entry.metadata is not metadata:
+            _CATALOG_CACHE[key] = replace(entry, metadata=metadata)
+
+
+def _refresh_catalog(lang: str, day: date) -> asyncio.Task:
+    """Starts a fetch for (lang, day), or joins the one already running."""
+    key = (lang, day.strftime("%Y%m%d"))
+    task = _CATALOG_INFLIGHT.get(key)
+    if task is None:
+        task = asyncio.create_task(_fetch_catalog(lang, day), name=f"Catalog refresh {lang}/{key[1]}")
+        _CATALOG_INFLIGHT[key] = task
+        task.add_done_callback(lambda _: _CATALOG_INFLIGHT.pop(key, None))
+        task.add_done_callback(log_task_failure)
+    return task
+
+
+async def get_catalog(lang: str, day: date = None) -> Catalog:
+    """
+    Returns the cached catalog for `lang` on `day` (today by default).
+
+    A fresh entry costs no round-trip to Spaces. An expired one is still
+    returned immediately while a single background refresh replaces it;
+    concurrent misses all wait on that same fetch.
+    """
+    day = day or date.today()
+    entry = _CATALOG_CACHE.get((lang, day.strftime("%Y%m%d")))
+    if entry is not None:
+        if time.monotonic() - entry.fetched_at > settings.CATALOG_TTL:
+            cache_lookup("catalog", "stale")
+            _refresh_catalog(lang, day)
+        else:
+            cache_lookup("catalog", "hit")
+        return entry
+    cache_lookup("catalog", "miss")
+    # shield so one cancelled caller does not cancel the shared fetch
+    return await asyncio.shield(_refresh_catalog(lang, day))
 
-    slots = _list_for_stamp(lang, today_str)
-    if slots:
-        return slots
 
-    # fallback to yesterday
-    yesterday = today - timedelta(days=1)
-    yesterday_str = yesterday.strftime("%Y%m%d")
-    return _list_for_stamp(lang, yesterday_str)
+async def refresh_catalog(lang: str, day: date = None) -> Catalog:
+    """Re-fetches the catalog now, joining a refresh that is already running."""
+    return await asyncio.shield(_refresh_catalog(lang, day or date.today()))
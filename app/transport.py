@@ -0,0 +1,97 @@
+# app/transport.py
+import ssl
+import time
+from typing import Optional
+import httpx
+from telegram import Bot
+from telegram.request import HTTPXRequest
+from app.config import settings
+from app.metrics import BOT_API_SECONDS
+
+
+_SSL_CONTEXT: Optional[ssl.SSLContext] = None
+
+
+def _ssl_context() -> ssl.SSLContext:
+    # loading the CA bundle costs ~40ms per client; every pool shares one
+    # (all of them speak TELEGRAM_HTTP_VERSION, so the ALPN setting fits)
+    global _SSL_CONTEXT
+    if _SSL_CONTEXT is None:
+        _SSL_CONTEXT = httpx.create_ssl_context(http2=settings.TELEGRAM_HTTP_VERSION == "2")
+    return _SSL_CONTEXT
+
+
+class TunedHTTPXRequest(HTTPXRequest):
+    """
+    HTTPXRequest whose keep-alive pool can be sized and expired separately,
+    and which times every Bot API call by method under the pool's `name`.
+    """
+
+    def __init__(self, keepalive_connections: int, keepalive_expiry: float, name: str = "interactive", **kwargs):
+        # set before super().__init__, which builds the client
+        self._keepalive = (keepalive_connections, keepalive_expiry)
+        self.name = name
+        super().__init__(**kwargs)
+
+    def _build_client(self) -> httpx.AsyncClient:
+        max_connections = self._client_kwargs["limits"].max_connections
+        keepalive_connections, keepalive_expiry = self._keepalive
+        self._client_kwargs["limits"] = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=min(keepalive_connections, max_connections),
+            keepalive_expiry=keepalive_expiry,
+        )
+        self._client_kwargs["verify"] = _ssl_context()
+        return super()._build_client()
+
+    async def do_request(self, url: str, method: str, *args, **kwargs):
+        # .../bot<token>/sendMessage -> sendMessage
+        api_method = url.rsplit("/", 1)[-1]
+        start = time.perf_counter()
+        try:
+            return await super().do_request(url, method, *args, **kwargs)
+        finally:
+            BOT_API_SECONDS.observe(time.perf_counter() - start, pool=self.name, method=api_method)
+
+
+def build_request(pool_size: int, pool_timeout: float, name: str) -> TunedHTTPXRequest:
+    return TunedHTTPXRequest(
+        name=name,
+        connection_pool_size=pool_size,
+        keepalive_connections=pool_size,
+        keepalive_expiry=settings.TELEGRAM_KEEPALIVE_EXPIRY,
+        read_timeout=settings.TELEGRAM_READ_TIMEOUT,
+        write_timeout=settings.TELEGRAM_WRITE_TIMEOUT,
+        connect_timeout=settings.TELEGRAM_CONNECT_TIMEOUT,
+        pool_timeout=pool_timeout,
+        http_version=settings.TELEGRAM_HTTP_VERSION,
+    )
+
+
+def interactive_request() -> TunedHTTPXRequest:
+    """Connection pool for replies to users; never shared with broadcasts."""
+    return build_request(settings.TELEGRAM_POOL_SIZE, settings.TELEGRAM_POOL_TIMEOUT, "interactive")
+
+
+def get_updates_request() -> TunedHTTPXRequest:
+    # webhook mode never polls, but PTB builds the pool anyway
+    return build_request(1, settings.TELEGRAM_POOL_TIMEOUT, "get_updates")
+
+
+_BULK_BOT: Bot = None
+
+
+def bulk_bot() -> Bot:
+    """
+    A second Bot on its own, smaller connection pool, used for broadcast
+    sends. A running broadcast can only ever hold these connections, so
+    clicks keep the interactive pool to themselves.
+    """
+    global _BULK_BOT
+    if _BULK_BOT is None:
+        _BULK_BOT = Bot(
+            settings.TELEGRAM_TOKEN,
+            **({"base_url": settings.TELEGRAM_BASE_URL} if settings.TELEGRAM_BASE_URL else {}),
+            request=build_request(settings.TELEGRAM_BULK_POOL_SIZE, settings.TELEGRAM_BULK_POOL_TIMEOUT, "bulk"),
+        )
+    return _BULK_BOT
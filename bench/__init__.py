@@ -0,0 +1,4 @@
+"""
+Load tests and benchmarks: local stand-ins for the Bot API and Spaces, and
+the `bench.run` harness that drives the app against them. See bench/run.py.
+"""
@@ -0,0 +1,129 @@
+# bench/fake_s3.py
+"""
+A local, in-memory stand-in for the Spaces (S3) bucket: ListObjectsV2 with
+prefixes, delimiters and continuation tokens, and GetObject with ETags and
+If-None-Match, which is all spaces_client uses. `seed_catalog` fills it
+with the layout the bot expects.
+"""
+import asyncio
+import hashlib
+import json
+import random
+from datetime import date, datetime, timedelta, timezone
+from email.utils import format_datetime
+from xml.sax.saxutils import escape
+from fastapi import FastAPI, Request, Response
+
+_NS = "http://s3.amazonaws.com/doc/2006-03-01/"
+
+
+def _error(status: int, code: str, message: str) -> Response:
+    body = f'<?xml version="1.0" encoding="UTF-8"?><Error><Code>{code}</Code><Message>{message}</Message></Error>'
+    return Response(body, status_code=status, media_type="application/xml")
+
+
+class FakeSpaces:
+    def __init__(self, bucket: str, latency: float = 0.0):
+        self.bucket = bucket
+        self.latency = latency
+        # key -> (body, etag, last modified)
+        self.objects: dict[str, tuple[bytes, str, datetime]] = {}
+        self.requests = 0
+        self.app = FastAPI()
+        self.app.get("/{bucket}")(self._list)
+        self.app.get("/{bucket}/{key:path}")(self._get)
+
+    def put(self, key: str, body: bytes) -> None:
+        etag = '"' + hashlib.md5(body).hexdigest() + '"'
+        self.objects[key] = (body, etag, datetime.now(timezone.utc).replace(microsecond=0))
+
+    async def _list(self, bucket: str, request: Request) -> Response:
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if bucket != self.bucket:
+            return _error(404, "NoSuchBucket", bucket)
+        q = request.query_params
+        prefix, delimiter = q.get("prefix", ""), q.get("delimiter")
+        max_keys = int(q.get("max-keys", 1000))
+        after = q.get("continuation-token") or q.get("start-after") or ""
+
+        contents, prefixes, truncated, last = [], [], False, None
+        for key in sorted(k for k in self.objects if k.startswith(prefix) and k > after):
+            rest = key[len(prefix):]
+            if delimiter and delimiter in rest:
+                common = prefix + rest.split(delimiter, 1)[0] + delimiter
+                if common not in prefixes:
+                    prefixes.append(common)
+                continue
+            if len(contents) == max_keys:
+                truncated = True
+                break
+            contents.append(key)
+            last = key
+
+        parts = [
+            f'<?xml version="1.0" encoding="UTF-8"?><ListBucketResult xmlns="{_NS}">',
+            f"<Name>{escape(bucket)}</Name><Prefix>{escape(prefix)}</Prefix>",
+            f"<KeyCount>{len(contents)}</KeyCount><MaxKeys>{max_keys}</MaxKeys>",
+            f"<IsTruncated>{'true' if truncated else 'false'}</IsTruncated>",
+        ]
+        if delimiter:
+            parts.append(f"<Delimiter>{escape(delimiter)}</Delimiter>")
+        if truncated:
+            parts.append(f"<NextContinuationToken>{escape(last)}</NextContinuationToken>")
+        for key in contents:
+            body, etag, modified = self.objects[key]
+            parts.append(
+                f"<Contents><Key>{escape(key)}</Key>"
+                f"<LastModified>{modified.strftime('%Y-%m-%dT%H:%M:%S.000Z')}</LastModified>"
+                f"<ETag>{escape(etag)}</ETag><Size>{len(body)}</Size>"
+                f"<StorageClass>STANDARD</StorageClass></Contents>"
+            )
+        for common in prefixes:
+            parts.append(f"<CommonPrefixes><Prefix>{escape(common)}</Prefix></CommonPrefixes>")
+        parts.append("</ListBucketResult>")
+        return Response("".join(parts), media_type="application/xml")
+
+    async def _get(self, bucket: str, key: str, request: Request) -> Response:
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        entry = self.objects.get(key) if bucket == self.bucket else None
+        if entry is None:
+            return _error(404, "NoSuchKey", key)
+        body, etag, modified = entry
+        headers = {"ETag": etag, "Last-Modified": format_datetime(modified, usegmt=True)}
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers=headers)
+        return Response(body, headers=headers, media_type="application/octet-stream")
+
+
+def seed_catalog(spaces: FakeSpaces, langs, slots: int, day: date = None, seed: int = 0,
+                 layout: str = "flat", history_days: int = 0) -> None:
+    """
+    Writes config/play_url.txt and, per language, metadata.json plus `slots`
+    images for `day`. The `flat` layout (`<lang>/<name>_<YYYYMMDD>.png`, as
+    in production) also keeps `history_days` earlier days of images beside
+    them, which every flat listing has to page through; `partitioned` puts
+    each day under `<lang>/<YYYYMMDD>/`.
+    """
+    rng = random.Random(seed)
+    day = day or date.today()
+    spaces.put("config/play_url.txt", b"https://example.com/play\n")
+    for lang in langs:
+        metadata = {}
+        for i in range(slots):
+            name = f"slot_{i + 1:02d}"
+            if layout == "partitioned":
+                spaces.put(f"{lang}/{day:%Y%m%d}/{name}.png", rng.randbytes(2048))
+            else:
+                for back in range(history_days + 1):
+                    spaces.put(f"{lang}/{name}_{day - timedelta(days=back):%Y%m%d}.png", rng.randbytes(2048))
+            metadata[name.replace("_", " ").title()] = {
+                "provider": "Bench",
+                "base_rtp": round(rng.uniform(94, 97), 2),
+                "instant_rtp": round(rng.uniform(90, 99), 2),
+                "weekly_rtp": round(rng.uniform(92, 98), 2),
+            }
+        spaces.put(f"{lang}/metadata.json", json.dumps(metadata).encode())
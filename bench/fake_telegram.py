@@ -0,0 +1,147 @@
+# bench/fake_telegram.py
+"""
+A local stand-in for the Bot API. It answers every method the bot uses with
+plausible objects, remembers the last message shown in each chat (so the
+load driver can tap that message's buttons), and lets the driver wait for
+the next visible reply in a chat to measure end-to-end latency.
+"""
+import asyncio
+import hashlib
+import json
+import time
+from collections import Counter
+from typing import Callable, Optional
+from urllib.parse import parse_qsl
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+# methods that put something on the user's screen
+VISIBLE_METHODS = {
+    "sendMessage", "sendPhoto", "sendVideo", "sendAnimation",
+    "editMessageText", "editMessageMedia", "editMessageCaption", "editMessageReplyMarkup",
+}
+
+
+def _decode(value: str):
+    # PTB form-encodes each parameter as JSON (objects) or a bare string
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+
+def _file_id(kind: str, source: str) -> str:
+    if source.startswith("bench-"):
+        return source
+    return f"bench-{kind}-" + hashlib.md5(source.encode()).hexdigest()
+
+
+class FakeTelegram:
+    def __init__(self, token: str, latency: float = 0.0, username: str = "rtp_bench_bot"):
+        self.bot_id = int(token.split(":", 1)[0])
+        self.username = username
+        self.latency = latency
+        self.calls: Counter = Counter()
+        # chat_id -> calls made for that chat, by method
+        self.chat_calls: dict[int, Counter] = {}
+        # (monotonic time, method, chat_id, text) of every visible call
+        self.log: list[tuple[float, str, int, Optional[str]]] = []
+        self.last_message: dict[int, dict] = {}
+        self.webhook_url = ""
+        self._waiters: dict[int, list[tuple[Callable[[dict], bool], asyncio.Future]]] = {}
+        self._message_id = 0
+        self.app = FastAPI()
+        self.app.post("/bot{token}/{method}")(self._handle)
+
+    def expect(self, chat_id: int, predicate: Callable[[dict], bool] = None) -> asyncio.Future:
+        """A future resolved with the time of the next visible reply in `chat_id`."""
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(chat_id, []).append((predicate or (lambda _: True), future))
+        return future
+
+    def _resolve(self, chat_id: int, message: dict, at: float) -> None:
+        waiters = self._waiters.get(chat_id)
+        if not waiters:
+            return
+        for entry in list(waiters):
+            predicate, future = entry
+            if future.done():
+                waiters.remove(entry)
+            elif predicate(message):
+                waiters.remove(entry)
+                future.set_result(at)
+                return
+
+    async def _handle(self, token: str, method: str, request: Request) -> JSONResponse:
+        body = await request.body()
+        if request.headers.get("content-type", "").startswith("application/json"):
+            params = json.loads(body or b"{}")
+        else:
+            params = {k: _decode(v) for k, v in parse_qsl(body.decode())}
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.calls[method] += 1
+        if "chat_id" in params:
+            self.chat_calls.setdefault(int(params["chat_id"]), Counter())[method] += 1
+        result = self._result(method, params)
+        if method in VISIBLE_METHODS and isinstance(result, dict):
+            chat_id = result["chat"]["id"]
+            now = time.monotonic()
+            self.log.append((now, method, chat_id, result.get("text")))
+            self.last_message[chat_id] = result
+            self._resolve(chat_id, result, now)
+        return JSONResponse({"ok": True, "result": result})
+
+    def _message(self, params: dict, message_id: int = None) -> dict:
+        if message_id is None:
+            self._message_id += 1
+            message_id = self._message_id
+        message = {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": int(params["chat_id"]), "type": "private"},
+            "from": {"id": self.bot_id, "is_bot": True, "first_name": "Bench", "username": self.username},
+        }
+        if params.get("reply_markup"):
+            message["reply_markup"] = params["reply_markup"]
+        return message
+
+    def _result(self, method: str, params: dict):
+        if method == "getMe":
+            return {
+                "id": self.bot_id, "is_bot": True, "first_name": "Bench", "username": self.username,
+                "can_join_groups": False, "can_read_all_group_messages": False, "supports_inline_queries": False,
+            }
+        if method == "getWebhookInfo":
+            return {"url": self.webhook_url, "has_custom_certificate": False, "pending_update_count": 0}
+        if method in ("setWebhook", "deleteWebhook"):
+            self.webhook_url = params.get("url", "") if method == "setWebhook" else ""
+            return True
+        if method == "sendMessage":
+            return {**self._message(params), "text": params.get("text", "")}
+        if method in ("sendPhoto", "sendVideo", "sendAnimation"):
+            kind = method[4:].lower()
+            source = str(params.get(kind, ""))
+            media = {"file_id": _file_id(kind, source), "file_unique_id": source[-16:] or "x"}
+            message = {**self._message(params), "caption": params.get("caption")}
+            if kind == "photo":
+                message["photo"] = [{**media, "width": 800, "height": 600}]
+            else:
+                message[kind] = {**media, "width": 800, "height": 600, "duration": 1}
+            return message
+        if method == "editMessageText":
+            return {**self._message(params, int(params["message_id"])), "text": params.get("text", "")}
+        if method == "editMessageMedia":
+            media = params.get("media") or {}
+            source = str(media.get("media", ""))
+            return {
+                **self._message(params, int(params["message_id"])),
+                "caption": media.get("caption"),
+                "photo": [{"file_id": _file_id("photo", source), "file_unique_id": source[-16:] or "x",
+                           "width": 800, "height": 600}],
+            }
+        if method in ("editMessageCaption", "editMessageReplyMarkup"):
+            previous = self.last_message.get(int(params["chat_id"]), {})
+            return {**previous, **self._message(params, int(params["message_id"])), "caption": params.get("caption")}
+        # answerCallbackQuery, deleteMessage, ...
+        return True
@@ -0,0 +1,124 @@
+# tests/test_broadcast.py
+import asyncio
+import time
+import httpx
+from telegram.error import Forbidden, NetworkError, RetryAfter, TimedOut
+from app.broadcast import BroadcastEngine, TokenBucket
+
+
+async def _recipients(chat_ids):
+    for chat_id in chat_ids:
+        yield chat_id
+
+
+def _engine(send, **kwargs):
+    options = {"concurrency": 4, "rate": 1000, "per_chat_interval": 0.01, **kwargs}
+    return BroadcastEngine(send, **options)
+
+
+def test_retry_after_pauses_and_requeues():
+    attempts = {}
+    sent_at = {}
+
+    async def send(chat_id):
+        attempts[chat_id] = attempts.get(chat_id, 0) + 1
+        if chat_id == 1 and attempts[chat_id] == 1:
+            raise RetryAfter(0.2)
+        sent_at[chat_id] = time.monotonic()
+
+    async def run():
+        engine = _engine(send, concurrency=1)
+        started = time.monotonic()
+        stats = await engine.run(_recipients([1, 2, 3]))
+        return stats, started
+
+    stats, started = asyncio.run(run())
+    assert (stats.sent, stats.failed, stats.retried) == (3, 0, 1)
+    assert attempts[1] == 2
+    # the flood-wait held back every sender, not only the one that hit it
+    assert min(sent_at.values()) - started >= 0.2
+
+
+def test_gives_up_after_max_attempts():
+    results = []
+
+    async def send(chat_id):
+        raise NetworkError("connection reset")
+
+    stats = asyncio.run(_engine(send, max_attempts=3, on_result=lambda *r: results.append(r)).run(_recipients([7])))
+    assert (stats.sent, stats.failed, stats.retried) == (0, 1, 2)
+    assert results == [(7, "failed", "connection reset")]
+
+
+def test_unreachable_chats_are_not_retried():
+    unreachable = []
+
+    async def send(chat_id):
+        if chat_id == 2:
+            raise Forbidden("bot was blocked by the user")
+
+    stats = asyncio.run(_engine(send, on_unreachable=unreachable.append).run(_recipients([1, 2, 3])))
+    assert (stats.sent, stats.failed, stats.retried) == (2, 1, 0)
+    assert unreachable == [2]
+
+
+def test_token_bucket_paces_after_burst():
+    async def run():
+        bucket = TokenBucket(rate=50, capacity=5)
+        started = time.monotonic()
+        for _ in range(15):
+            await bucket.acquire()
+        return time.monotonic() - started
+
+    # 5 from the burst, the other 10 at 50/s
+    assert 0.18 <= asyncio.run(run()) < 0.5
+
+
+def test_no_burst_after_pause():
+    async def run():
+        bucket = TokenBucket(rate=20, capacity=5)
+        started = time.monotonic()
+        bucket.pause(0.2)
+        times = []
+        for _ in range(3):
+            await bucket.acquire()
+            times.append(time.monotonic() - started)
+        return times
+
+    times = asyncio.run(run())
+    # tokens are earned again only once the pause is over, one per 50ms
+    assert times[0] >= 0.24
+    assert all(b - a >= 0.04 for a, b in zip(times, times[1:]))
+
+
+def test_read_timeout_is_not_resent():
+    attempts = []
+
+    async def send(chat_id):
+        attempts.append(chat_id)
+        try:
+            raise httpx.ReadTimeout("read timed out")
+        except httpx.ReadTimeout as e:
+            raise TimedOut() from e
+
+    results = []
+    stats = asyncio.run(_engine(send, on_result=lambda *r: results.append(r)).run(_recipients([5])))
+    assert attempts == [5]
+    assert (stats.sent, stats.failed, stats.unknown, stats.retried) == (0, 0, 1, 0)
+    assert results[0][:2] == (5, "unknown")
+
+
+def test_connect_timeout_is_retried():
+    attempts = []
+
+    async def send(chat_id):
+        attempts.append(chat_id)
+        if len(attempts) == 1:
+            try:
+                raise httpx.ConnectTimeout("connect timed out")
+            except httpx.ConnectTimeout as e:
+                raise TimedOut() from e
+
+    stats = asyncio.run(_engine(send).run(_recipients([5])))
+    assert attempts == [5, 5]
+    assert (stats.sent, stats.unknown, stats.retried) == (1, 0, 1)
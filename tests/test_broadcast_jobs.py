@@ -0,0 +1,91 @@
+# tests/test_broadcast_jobs.py
+import asyncio
+import time
+from contextlib import asynccontextmanager
+import pytest
+from app import broadcast_jobs
+from app.broadcast_jobs import DeliveryLog, LeaseLost, acquire_job
+
+
+class FakeDatabase:
+    """One broadcast job's lease, answered the way the job queries' SQL would."""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.owner = None
+        self.lease_until = 0.0
+        self.claimed: set[int] = set()
+        self.statements: list[str] = []
+
+    @asynccontextmanager
+    async def transaction(self):
+        yield
+
+    async def fetch_val(self, query, values=None):
+        if "RETURNING lease_owner" in query:  # acquire_job
+            if self.owner not in (None, values["owner"]) and self.lease_until > time.monotonic():
+                return None
+            self.owner, self.lease_until = values["owner"], time.monotonic() + self.ttl
+            return self.owner
+        if "lease_owner = :owner RETURNING id" in query:  # DeliveryLog._renew
+            if self.owner != values["owner"]:
+                return None
+            self.lease_until = time.monotonic() + self.ttl
+            return values["job_id"]
+        raise AssertionError(query)
+
+    async def execute(self, query, values=None):
+        self.statements.append(query)
+
+    async def fetch_all(self, query, values=None):
+        fresh = [c for c in values["chat_ids"] if c not in self.claimed]
+        self.claimed.update(fresh)
+        return [{"chat_id": c} for c in fresh]
+
+    async def fetch_one(self, query):
+        return {"id": 1}
+
+
+@pytest.fixture
+def db(monkeypatch):
+    db = FakeDatabase(ttl=0.05)
+    monkeypatch.setattr(broadcast_jobs, "database", db)
+    return db
+
+
+def test_job_is_taken_over_once_its_lease_expires(db, monkeypatch):
+    async def run():
+        assert await acquire_job(1) is not None
+        monkeypatch.setattr(broadcast_jobs, "WORKER_ID", "other-worker")
+        # the first worker is still within its lease
+        assert await acquire_job(1) is None
+        await asyncio.sleep(0.06)
+        assert await acquire_job(1) is not None
+
+    asyncio.run(run())
+    assert db.owner == "other-worker"
+    # deliveries the first worker claimed but never confirmed are not resent
+    assert any("status = 'unknown'" in s for s in db.statements)
+
+
+def test_claims_and_flushes_stop_once_the_lease_is_lost(db, monkeypatch):
+    log = DeliveryLog(1, batch_size=10)
+
+    async def run():
+        await acquire_job(1)
+        assert await log.claim([1, 2], cursor=2) == [1, 2]
+        log.record(1, "sent", None)
+        # the lease expires and another worker takes the job over
+        await asyncio.sleep(0.06)
+        mine = broadcast_jobs.WORKER_ID
+        monkeypatch.setattr(broadcast_jobs, "WORKER_ID", "other-worker")
+        await acquire_job(1)
+        monkeypatch.setattr(broadcast_jobs, "WORKER_ID", mine)
+        with pytest.raises(LeaseLost):
+            await log.claim([3, 4], cursor=4)
+        with pytest.raises(LeaseLost):
+            await log.flush()
+
+    asyncio.run(run())
+    # the unconfirmed result is kept rather than silently dropped
+    assert log._buffer == [(1, "sent", None)]
@@ -0,0 +1,39 @@
+# tests/test_capture.py
+from app.capture import Scrubber
+
+UPDATE = {
+    "update_id": 1,
+    "message": {
+        "message_id": 7,
+        "from": {"id": 495956176, "is_bot": False, "first_name": "Aysel", "username": "aysel"},
+        "chat": {"id": 495956176, "type": "private", "first_name": "Aysel"},
+        "text": "/start ref_12345",
+        "reply_to_message": {"message_id": 6, "chat": {"id": -1001234, "type": "supergroup", "title": "Club"},
+                             "caption": "secret plans"},
+        "contact": {"phone_number": "+994501234567", "user_id": 495956176},
+    },
+}
+
+
+def test_ids_and_names_map_to_stable_pseudonyms():
+    scrubbed = Scrubber(b"key").scrub(UPDATE)
+    message = scrubbed["message"]
+    fake_id = message["from"]["id"]
+    assert fake_id != 495956176
+    # the same person stays the same person, so per-chat replay order survives
+    assert message["chat"]["id"] == fake_id
+    assert Scrubber(b"key").scrub(UPDATE)["message"]["from"]["id"] == fake_id
+    assert Scrubber(b"other").scrub(UPDATE)["message"]["from"]["id"] != fake_id
+    # groups and channels keep their negative sign
+    assert message["reply_to_message"]["chat"]["id"] < 0
+    assert message["from"]["first_name"].startswith("first_name-")
+    assert "Aysel" not in str(scrubbed) and "aysel" not in str(scrubbed)
+    # message and update ids are not personal and are kept
+    assert (scrubbed["update_id"], message["message_id"]) == (1, 7)
+
+
+def test_text_is_blanked_but_commands_survive():
+    message = Scrubber(b"key").scrub(UPDATE)["message"]
+    assert message["text"] == "/start"
+    assert message["reply_to_message"]["caption"] == "•" * len("secret plans")
+    assert "contact" not in message
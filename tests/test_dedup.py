@@ -0,0 +1,39 @@
+# tests/test_dedup.py
+import asyncio
+from app import dedup
+from app.dedup import UpdateDeduplicator
+
+
+def test_window_is_bounded():
+    deduplicator = UpdateDeduplicator(window=3, durable=False, ttl=60)
+
+    async def run():
+        first = [await deduplicator.claim(update_id) for update_id in range(1, 6)]
+        # 4 and 5 are still remembered; 1 has been pushed out of the window
+        return first, await deduplicator.claim(5), await deduplicator.claim(1)
+
+    first, repeat, evicted = asyncio.run(run())
+    assert first == [True] * 5
+    assert repeat is False
+    assert evicted is True
+    assert len(deduplicator._seen) == 3
+
+
+def test_concurrent_deliveries_share_one_claim(monkeypatch):
+    inserts = []
+
+    class FakeQueries:
+        async def fetch(self, name, update_ids):
+            inserts.append(update_ids)
+            await asyncio.sleep(0.01)
+            return [{"update_id": u} for u in update_ids]
+
+    monkeypatch.setattr(dedup, "queries", FakeQueries())
+    deduplicator = UpdateDeduplicator(window=10, durable=True, ttl=60)
+
+    async def run():
+        return await asyncio.gather(deduplicator.claim(1), deduplicator.claim(1), deduplicator.claim(2))
+
+    assert asyncio.run(run()) == [True, False, True]
+    # 1 and 2 claimed in one batch; the duplicate of 1 never reached Postgres
+    assert inserts == [[1, 2]]
@@ -0,0 +1,93 @@
+# tests/test_dispatcher.py
+import asyncio
+import pytest
+from fastapi.testclient import TestClient
+from telegram import Update
+from app import main
+from app.dispatcher import UpdateDispatcher
+
+
+def _update(update_id, chat_id):
+    return Update.de_json({
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id, "date": 0, "text": "/start",
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": "x"},
+        },
+    }, None)
+
+
+class SlowApplication:
+    """Takes longer over update 11, so reordering would show."""
+
+    def __init__(self):
+        self.done = []
+
+    async def process_update(self, update):
+        await asyncio.sleep(0.05 if update.update_id == 11 else 0)
+        self.done.append(update.update_id)
+
+
+def test_a_chats_updates_run_in_order_while_other_chats_proceed():
+    application = SlowApplication()
+    dispatcher = UpdateDispatcher(application, workers=4, queue_size=100, put_timeout=1)
+
+    async def run():
+        dispatcher.start()
+        # chat 1 -> updates 11, 12, 13; chat 2 -> 21, 22
+        for update_id, chat_id in [(11, 1), (21, 2), (12, 1), (22, 2), (13, 1)]:
+            assert await dispatcher.submit(_update(update_id, chat_id))
+        await dispatcher.stop()
+
+    asyncio.run(run())
+    done = application.done
+    assert [u for u in done if u < 20] == [11, 12, 13]
+    # chat 2 did not wait behind chat 1's slow update
+    assert done.index(22) < done.index(11)
+
+
+def test_submit_reports_a_full_queue_after_the_timeout():
+    class StuckApplication:
+        async def process_update(self, update):
+            await asyncio.sleep(10)
+
+    dispatcher = UpdateDispatcher(StuckApplication(), workers=1, queue_size=1, put_timeout=0.05)
+
+    async def run():
+        dispatcher.start()
+        accepted = [await dispatcher.submit(_update(i, 1)) for i in range(1, 4)]
+        await dispatcher.stop(timeout=0)
+        return accepted
+
+    # one being processed, one queued, the third finds no room
+    assert asyncio.run(run()) == [True, True, False]
+
+
+@pytest.fixture
+def full_queue(monkeypatch):
+    released = []
+
+    async def submit(update):
+        return False
+
+    async def claim(update_id):
+        return True
+
+    async def release(update_id):
+        released.append(update_id)
+
+    monkeypatch.setattr(main.dispatcher, "submit", submit)
+    monkeypatch.setattr(main.deduplicator, "claim", claim)
+    monkeypatch.setattr(main.deduplicator, "release", release)
+    return released
+
+
+@pytest.mark.parametrize("shed, status, released", [(False, 503, [7]), (True, 200, [])])
+def test_full_queue_pushes_back_or_sheds(monkeypatch, full_queue, shed, status, released):
+    monkeypatch.setattr(main.settings, "UPDATE_SHED_WHEN_FULL", shed)
+    update = _update(7, 1).to_dict()
+    response = TestClient(main.app).post("/webhook", json=update)
+    assert response.status_code == status
+    # a 503 makes Telegram redeliver, which must not be taken for a duplicate
+    assert full_queue == released
@@ -0,0 +1,62 @@
+# tests/test_events.py
+import asyncio
+import re
+from datetime import date
+import pytest
+from app import events as events_module
+from app.events import ensure_partitions
+
+
+class FakeDatabase:
+    """Just enough of Postgres' catalog for ensure_partitions."""
+
+    def __init__(self, partitions, default_days):
+        self.partitions = set(partitions)
+        # days with rows sitting in events_default, as 'YYYY-MM-DD'
+        self.default_days = set(default_days)
+        self.statements = []
+
+    async def fetch_val(self, query):
+        if "to_regclass" in query:
+            return re.search(r"to_regclass\('(\w+)'\)", query).group(1) in self.partitions
+        day = re.search(r"created_at >= '(\S+) ", query).group(1)
+        self.statements.append(f"MOVE {day}")
+        if day in self.default_days:
+            self.default_days.discard(day)
+            return 1
+        return None
+
+    async def execute(self, query):
+        self.statements.append(query)
+        if match := re.match(r"ALTER TABLE events ATTACH PARTITION (\w+)", query):
+            self.partitions.add(match.group(1))
+        elif match := re.match(r"DROP TABLE (\w+)", query):
+            self.partitions.discard(match.group(1))
+
+    async def fetch_all(self, query):
+        return [{"relname": name} for name in sorted(self.partitions | {"events_default"})]
+
+
+@pytest.fixture
+def db(monkeypatch):
+    fake = FakeDatabase(partitions={"events_20260101", "events_20260301"}, default_days={"2026-03-02"})
+    monkeypatch.setattr(events_module, "database", fake)
+    return fake
+
+
+def test_partitions_roll_forward_and_expire(db):
+    asyncio.run(ensure_partitions(date(2026, 3, 1), ahead=2, retention_days=30))
+    assert db.partitions == {"events_20260301", "events_20260302", "events_20260303"}
+    assert not any("CREATE TABLE events_20260301" in s for s in db.statements)
+    assert "DROP TABLE events_20260101" in db.statements
+
+
+def test_rows_in_the_default_partition_move_before_attaching(db):
+    asyncio.run(ensure_partitions(date(2026, 3, 1), ahead=1, retention_days=365))
+    created = db.statements.index(next(s for s in db.statements if s.startswith("CREATE TABLE events_20260302")))
+    moved = db.statements.index("MOVE 2026-03-02")
+    attached = db.statements.index(next(s for s in db.statements if "ATTACH PARTITION events_20260302" in s))
+    # Postgres refuses the ATTACH while events_default still holds rows for that day
+    assert created < moved < attached
+    assert db.default_days == set()
+    assert "FOR VALUES FROM ('2026-03-02 00:00:00+00') TO ('2026-03-03 00:00:00+00')" in db.statements[attached]
@@ -0,0 +1,93 @@
+# tests/test_navigation.py
+import asyncio
+from telegram.error import BadRequest
+from app.navigation import show_photo, show_text
+
+
+class FakeMessage:
+    def __init__(self, photo=()):
+        self.photo = list(photo)
+        self.calls = []
+
+    async def reply_text(self, text, **kwargs):
+        self.calls.append("reply_text")
+        return FakeMessage()
+
+    async def reply_photo(self, photo, **kwargs):
+        self.calls.append("reply_photo")
+        return FakeMessage(photo=[photo])
+
+    async def delete(self):
+        self.calls.append("delete")
+
+
+class FakeQuery:
+    def __init__(self, message, edit_error=None):
+        self.message = message
+        self.edit_error = edit_error
+
+    async def _edit(self, method):
+        self.message.calls.append(method)
+        if self.edit_error is not None:
+            raise BadRequest(self.edit_error)
+        return self.message
+
+    async def edit_message_text(self, text, **kwargs):
+        return await self._edit("edit_message_text")
+
+    async def edit_message_media(self, media, **kwargs):
+        return await self._edit("edit_message_media")
+
+
+async def _settle():
+    # let the background delete run
+    await asyncio.sleep(0)
+
+
+def test_text_screens_are_edited_in_place():
+    message = FakeMessage()
+
+    async def run():
+        assert await show_text(FakeQuery(message), "menu", None) is message
+        await _settle()
+
+    asyncio.run(run())
+    assert message.calls == ["edit_message_text"]
+
+
+def test_a_failed_edit_falls_back_to_a_new_message():
+    message = FakeMessage()
+
+    async def run():
+        new = await show_text(FakeQuery(message, "Message to edit not found"), "menu", None)
+        await _settle()
+        return new
+
+    assert asyncio.run(run()) is not message
+    assert message.calls == ["edit_message_text", "reply_text", "delete"]
+
+
+def test_an_unchanged_screen_is_left_alone():
+    message = FakeMessage()
+
+    async def run():
+        new = await show_text(FakeQuery(message, "Message is not modified: specified new message content"), "menu", None)
+        await _settle()
+        return new
+
+    assert asyncio.run(run()) is message
+    assert message.calls == ["edit_message_text"]
+
+
+def test_switching_between_text_and_photo_replaces_the_message():
+    text_message, photo_message = FakeMessage(), FakeMessage(photo=["card"])
+
+    async def run():
+        await show_photo(FakeQuery(text_message), "card", "caption", None)
+        await show_text(FakeQuery(photo_message), "menu", None)
+        await _settle()
+
+    asyncio.run(run())
+    # a text message cannot become a photo or the reverse, so no edit is tried
+    assert text_message.calls == ["reply_photo", "delete"]
+    assert photo_message.calls == ["reply_text", "delete"]
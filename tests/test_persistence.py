@@ -0,0 +1,99 @@
+# tests/test_persistence.py
+import asyncio
+import pytest
+from app import persistence as persistence_module
+from app.persistence import UserStatePersistence
+
+
+class FakeQueries:
+    def __init__(self, stored=None):
+        self.stored = dict(stored or {})
+        self.lookups = []
+        self.writes = []
+        self.failures = 0
+
+    async def fetchval(self, name, user_id):
+        self.lookups.append(user_id)
+        return self.stored.get(user_id)
+
+    async def execute(self, name, user_ids, langs):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("connection refused")
+        self.writes.append(dict(zip(user_ids, langs)))
+        self.stored.update(zip(user_ids, langs))
+
+
+class FakeApplication:
+    def __init__(self):
+        self.user_data = {}
+        self.dropped = []
+
+    def drop_user_data(self, user_id):
+        self.dropped.append(user_id)
+        self.user_data.pop(user_id, None)
+
+
+@pytest.fixture
+def queries(monkeypatch):
+    fake = FakeQueries({1: "AZ", 2: "RU"})
+    monkeypatch.setattr(persistence_module, "queries", fake)
+    monkeypatch.setattr(persistence_module, "notify", lambda event, data: None)
+    return fake
+
+
+def _persistence(cache_size):
+    persistence = UserStatePersistence(cache_size=cache_size, update_interval=60)
+    persistence.application = FakeApplication()
+    return persistence
+
+
+def test_lru_looks_users_up_once_and_evicts_the_oldest(queries):
+    persistence = _persistence(cache_size=2)
+
+    async def run():
+        for user_id in (1, 2, 1, 3):
+            user_data = {}
+            await persistence.refresh_user_data(user_id, user_data)
+        return user_data
+
+    assert asyncio.run(run()) == {}
+    # 1 was served from the cache the second time; users without a language are cached too
+    assert queries.lookups == [1, 2, 3]
+    assert list(persistence._cache) == [1, 3]
+    assert persistence.application.dropped == [2]
+
+
+def test_unwritten_changes_survive_eviction_and_a_failed_flush(queries):
+    persistence = _persistence(cache_size=1)
+    queries.failures = 1
+
+    async def run():
+        await persistence.update_user_data(5, {"lang": "EN"})
+        # evicting 5 before its write would lose the change
+        await persistence.refresh_user_data(1, {})
+        assert 5 in persistence._cache
+        with pytest.raises(ConnectionError):
+            await persistence.flush()
+        await persistence.update_user_data(6, {"lang": "TR"})
+        await persistence.flush()
+
+    asyncio.run(run())
+    # the failed change went out with the next flush, together with the newer one
+    assert queries.writes == [{5: "EN", 6: "TR"}]
+    assert persistence._buffer == {}
+
+
+def test_unchanged_languages_are_not_written(queries):
+    persistence = _persistence(cache_size=10)
+
+    async def run():
+        user_data = {}
+        await persistence.refresh_user_data(1, user_data)
+        await persistence.update_user_data(1, user_data)
+        await persistence.update_user_data(2, {})
+        await persistence.flush()
+        return user_data
+
+    assert asyncio.run(run()) == {"lang": "AZ"}
+    assert queries.writes == []
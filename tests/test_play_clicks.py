@@ -0,0 +1,52 @@
+# tests/test_play_clicks.py
+from types import SimpleNamespace
+import pytest
+from fastapi.testclient import TestClient
+from app import main, ranking
+from app.ranking import play_link, play_signature
+from app.spaces_client import play_url_object
+
+PLAY_URL = "https://play.example.com/"
+
+
+@pytest.fixture
+def clicks(monkeypatch):
+    recorded = []
+    monkeypatch.setattr(play_url_object(), "value", PLAY_URL)
+    monkeypatch.setattr(main.events, "record", lambda kind, **kw: recorded.append((kind, kw)))
+    return recorded
+
+
+def test_play_link_is_the_play_url_unless_tracking(monkeypatch, clicks):
+    monkeypatch.setattr(ranking.settings, "TRACK_PLAY_CLICKS", False)
+    assert play_link("AZ", "Book of Ra") == PLAY_URL
+    monkeypatch.setattr(ranking.settings, "TRACK_PLAY_CLICKS", True)
+    assert play_link("AZ", "Book of Ra").endswith(
+        f"/go/play/AZ/Book%20of%20Ra?sig={play_signature('AZ', 'Book of Ra')}"
+    )
+
+
+def test_redirect_without_a_cached_ranking_goes_to_the_play_url(monkeypatch, clicks):
+    # e.g. a card built before a restart, clicked before this worker rebuilt the list
+    monkeypatch.setattr(main, "cached_ranking", lambda lang: None)
+    response = TestClient(main.app).get(
+        f"/go/play/AZ/Book of Ra?sig={play_signature('AZ', 'Book of Ra')}", follow_redirects=False,
+    )
+    assert response.status_code == 302
+    assert response.headers["location"] == PLAY_URL
+    assert clicks == []
+
+
+def test_only_signed_clicks_on_listed_slots_are_counted(monkeypatch, clicks):
+    monkeypatch.setattr(main, "cached_ranking", lambda lang: SimpleNamespace(slots={"Book of Ra": {}}))
+    client = TestClient(main.app)
+    sig = play_signature("AZ", "Book of Ra")
+    for path, user_agent in [
+        (f"/go/play/AZ/Book of Ra?sig={sig}", "Mozilla/5.0"),
+        ("/go/play/AZ/Book of Ra?sig=0000000000000000", "Mozilla/5.0"),
+        (f"/go/play/AZ/Gone?sig={play_signature('AZ', 'Gone')}", "Mozilla/5.0"),
+        (f"/go/play/AZ/Book of Ra?sig={sig}", "TelegramBot (like TwitterBot)"),
+    ]:
+        response = client.get(path, headers={"user-agent": user_agent}, follow_redirects=False)
+        assert response.headers["location"] == PLAY_URL
+    assert clicks == [("play", {"lang": "AZ", "slot": "Book of Ra"})]
@@ -0,0 +1,69 @@
+# tests/test_registrar.py
+import asyncio
+import pytest
+from app import registrar as registrar_module
+from app.registrar import UserRegistrar
+
+
+class FakeQueries:
+    def __init__(self):
+        self.calls = []
+        # statements that fail the next time they run
+        self.fail_once = set()
+
+    async def execute(self, name, *args):
+        if name in self.fail_once:
+            self.fail_once.discard(name)
+            raise ConnectionError("connection reset")
+        self.calls.append((name, *args))
+
+
+@pytest.fixture
+def queries(monkeypatch):
+    fake = FakeQueries()
+    monkeypatch.setattr(registrar_module, "queries", fake)
+    return fake
+
+
+def test_touched_users_are_forgotten_after_the_resolution(queries):
+    registrar = UserRegistrar(batch_size=100, flush_interval=60, seen_resolution=0.05)
+
+    async def run():
+        for chat_id in range(1, 4):
+            registrar.touch(chat_id)
+        registrar.touch(1)
+        await registrar.flush()
+        assert len(registrar._touched) == 3
+        await asyncio.sleep(0.06)
+        registrar.touch(4)
+        await registrar.flush()
+
+    asyncio.run(run())
+    # only the user touched within the last resolution is still remembered
+    assert list(registrar._touched) == [4]
+    assert [sorted(c[1]) for c in queries.calls if c[0] == "touch_users"] == [[1, 2, 3], [4]]
+
+
+def test_failed_flush_is_retried_whole(queries):
+    registrar = UserRegistrar(batch_size=100, flush_interval=60, seen_resolution=3600)
+    registrar.register(1, "alice")
+    registrar.deactivate(2)
+    registrar.touch(3)
+    # the insert goes through, the deactivation fails
+    queries.fail_once.add("deactivate_users")
+
+    async def run():
+        with pytest.raises(ConnectionError):
+            await registrar.flush()
+        registrar.register(4, None)
+        await registrar.flush()
+
+    asyncio.run(run())
+    names = [c[0] for c in queries.calls]
+    # every statement is idempotent, so the whole batch goes again, with 4 added
+    assert names == ["register_users", "register_users", "deactivate_users", "touch_users"]
+    assert queries.calls[1][1:] == ([1, 4], ["alice", None])
+    assert (registrar._pending, registrar._gone, registrar._seen) == ({}, set(), set())
+    # a registered user is never queued twice
+    registrar.register(1, "alice")
+    assert registrar._pending == {}
@@ -0,0 +1,96 @@
+# tests/test_spaces_client.py
+import asyncio
+from datetime import date, timedelta
+import pytest
+from app import spaces_client
+
+
+class FakeMetadata:
+    value = {}
+
+    async def refresh(self):
+        return False
+
+
+@pytest.fixture
+def catalogs(monkeypatch):
+    """Catalog fetches answered from `listing` ({stamp: slots}) instead of Spaces."""
+    listing = {}
+    monkeypatch.setattr(spaces_client, "_list_for_stamp", lambda lang, stamp: listing.get(stamp, []))
+    monkeypatch.setattr(spaces_client, "metadata_object", lambda lang: FakeMetadata())
+    monkeypatch.setattr(spaces_client, "_CATALOG_CACHE", {})
+    monkeypatch.setattr(spaces_client, "_CATALOG_INFLIGHT", {})
+    return listing
+
+
+def test_prefetching_tomorrow_keeps_today_cached(catalogs):
+    today, tomorrow = date.today(), date.today() + timedelta(days=1)
+    catalogs[today.strftime("%Y%m%d")] = [{"name": "Dogs", "image": "today.png"}]
+    catalogs[tomorrow.strftime("%Y%m%d")] = [{"name": "Cats", "image": "tomorrow.png"}]
+
+    async def run():
+        first = await spaces_client.get_catalog("AZ", today)
+        upcoming = await spaces_client.prefetch_catalog("AZ", tomorrow)
+        return first, upcoming, await spaces_client.get_catalog("AZ", today)
+
+    first, upcoming, again = asyncio.run(run())
+    assert upcoming.slots[0]["image"] == "tomorrow.png"
+    # a cache hit: the same object, not a new listing
+    assert again is first
+    assert spaces_client.cached_catalog("AZ", tomorrow) is upcoming
+
+
+def test_past_days_are_evicted(catalogs):
+    today, yesterday = date.today(), date.today() - timedelta(days=1)
+    catalogs[yesterday.strftime("%Y%m%d")] = [{"name": "Dogs", "image": "old.png"}]
+    catalogs[today.strftime("%Y%m%d")] = [{"name": "Dogs", "image": "new.png"}]
+
+    async def run():
+        await spaces_client.get_catalog("AZ", yesterday)
+        await spaces_client.get_catalog("AZ", today)
+
+    asyncio.run(run())
+    assert spaces_client.cached_catalog("AZ", yesterday) is None
+    assert spaces_client.cached_catalog("AZ", today) is not None
+
+
+def _objects(*keys):
+    return [{"Key": key, "ETag": f'"{key}"', "LastModified": 1} for key in keys]
+
+
+@pytest.fixture
+def bucket(monkeypatch):
+    """Listings served from `keys`, filtered by prefix like S3 (the delimiter hides sub-prefixes)."""
+    keys = []
+
+    def iter_objects(prefix, delimiter=None):
+        for obj in _objects(*keys):
+            rest = obj["Key"][len(prefix):]
+            if obj["Key"].startswith(prefix) and not (delimiter and delimiter in rest):
+                yield obj
+
+    monkeypatch.setattr(spaces_client, "_iter_objects", iter_objects)
+    return keys
+
+
+def test_partitioned_layout_is_preferred(bucket):
+    bucket += ["AZ/20261017/dogs.png", "AZ/dogs_20261017.png"]
+    slots = spaces_client._list_for_stamp("AZ", "20261017")
+    assert [s["source"] for s in slots] == ["AZ/20261017/dogs.png"]
+
+
+def test_falls_back_to_flat_layout_for_that_day_only(bucket):
+    bucket += ["AZ/dogs_20261016.png", "AZ/dogs_20261017.png", "AZ/cats_20261017.jpg",
+               "AZ/20261018/dogs.png", "AZ/metadata.json"]
+    slots = spaces_client._list_for_stamp("AZ", "20261017")
+    assert sorted((s["name"], s["source"]) for s in slots) == [
+        ("Cats", "AZ/cats_20261017.jpg"), ("Dogs", "AZ/dogs_20261017.png"),
+    ]
+
+
+def test_fresh_variant_is_served(bucket):
+    bucket += ["AZ/dogs_20261017.png", "AZ/dogs_20261017.tg.jpg", "AZ/cats_20261017.png"]
+    slots = {s["name"]: s for s in spaces_client._list_for_stamp("AZ", "20261017")}
+    assert len(slots) == 2
+    assert slots["Dogs"]["optimized"] and slots["Dogs"]["image"].endswith("/AZ/dogs_20261017.tg.jpg")
+    assert not slots["Cats"]["optimized"]